@@ -2,7 +2,13 @@ import os
 import json
 import uuid
 import asyncio
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from cache import TTLCache, cache_key, get_cached, remember
 
 try:
     from openai import AsyncOpenAI
@@ -14,21 +20,242 @@ try:
 except ImportError:
     DDGS = None
 
+# Кэши результатов: смета по описанию и сниппеты цен по позиции (общие для всех проектов).
+# Память процесса + таблица ai_cache, чтобы кэш был общим для воркеров и переживал рестарт.
+ESTIMATE_CACHE_TTL = float(os.getenv("AI_ESTIMATE_CACHE_TTL", str(7 * 24 * 3600)))
+PRICE_CACHE_TTL = float(os.getenv("AI_PRICE_CACHE_TTL", str(24 * 3600)))
+AI_CACHE_PERSIST = os.getenv("AI_CACHE_PERSIST", "1") == "1"
+
+_estimate_cache = TTLCache(maxsize=1000, ttl=ESTIMATE_CACHE_TTL)
+_price_cache = TTLCache(maxsize=5000, ttl=PRICE_CACHE_TTL)
+# Одновременные одинаковые запросы (обычные и потоковые) подписываются на один и тот же расчёт
+_inflight: Dict[str, "_EstimateRun"] = {}
+
+
+# --- Поиск цен ---
+# Отдельный ограниченный пул потоков: синхронный DDGS не занимает пул по умолчанию,
+# которым пользуются остальные run_in_executor / run_in_threadpool.
+AI_SEARCH_BACKEND = os.getenv("AI_SEARCH_BACKEND", "duckduckgo")
+AI_SEARCH_WORKERS = int(os.getenv("AI_SEARCH_WORKERS", "4"))
+AI_SEARCH_TIMEOUT = float(os.getenv("AI_SEARCH_TIMEOUT", "8"))
+AI_SEARCH_RATE = float(os.getenv("AI_SEARCH_RATE", "2"))  # запросов в секунду на процесс
+AI_SEARCH_MAX_RESULTS = 3
+
+
+class DuckDuckGoSearchBackend:
+    """DDGS держит HTTP-сессию; переиспользуем один экземпляр на поток пула."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            # HTTP-таймаут самого клиента: поток пула освобождается не позже AI_SEARCH_TIMEOUT
+            client = self._local.client = DDGS(timeout=AI_SEARCH_TIMEOUT)
+        return client
+
+    def search(self, query: str, max_results: int) -> List[str]:
+        results = self._client().text(query, region='ru-ru', max_results=max_results)
+        return [r.get('body', '') for r in results or []]
+
+
+class StubSearchBackend:
+    """Локальная заглушка для тестов и нагрузочных прогонов: без сети, с настраиваемой задержкой."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def search(self, query: str, max_results: int) -> List[str]:
+        if self.delay:
+            threading.Event().wait(self.delay)
+        return [f"{query}: от 1000 руб. (stub #{i + 1})" for i in range(max_results)]
+
+
+class RateLimiter:
+    """Равномерно распределяет вызовы: не чаще rate в секунду."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _default_search_backend():
+    if AI_SEARCH_BACKEND == "stub":
+        return StubSearchBackend(delay=float(os.getenv("AI_SEARCH_STUB_DELAY", "0")))
+    return DuckDuckGoSearchBackend() if DDGS else None
+
+
+_search_backend = _default_search_backend()
+_search_executor = ThreadPoolExecutor(max_workers=AI_SEARCH_WORKERS, thread_name_prefix="price-search")
+_search_rate_limiter = RateLimiter(AI_SEARCH_RATE)
+
+
+def set_search_backend(backend):
+    """Подменяет бэкенд поиска (например, StubSearchBackend в тестах)."""
+    global _search_backend
+    _search_backend = backend
+
+
+async def search_prices(item: str) -> str:
+    """Сниппеты цен по позиции сметы: кэш, затем поиск в выделенном пуле с rate limit и таймаутом."""
+    item_key = cache_key(item)
+    cached = await run_in_threadpool(get_cached, "price", _price_cache, item_key, AI_CACHE_PERSIST)
+    if cached is not None:
+        return cached
+    not_found = f"Товар: {item}. Информации о ценах не найдено."
+    if _search_backend is None:
+        return not_found
+    await _search_rate_limiter.acquire()
+    loop = asyncio.get_running_loop()
+    # wait_for только перестаёт ждать: поток пула продолжает поиск и остаётся занят, пока
+    # бэкенд не вернётся сам. Поэтому DuckDuckGoSearchBackend ограничивает HTTP тем же таймаутом
+    try:
+        snippets = await asyncio.wait_for(
+            loop.run_in_executor(
+                _search_executor,
+                _search_backend.search,
+                f"купить {item} цена интернет магазин",
+                AI_SEARCH_MAX_RESULTS,
+            ),
+            timeout=AI_SEARCH_TIMEOUT,
+        )
+    except Exception:
+        return not_found
+    result = f"Товар: {item}. Найденные данные в сети: " + " | ".join(snippets)
+    await run_in_threadpool(remember, "price", _price_cache, item_key, result, AI_CACHE_PERSIST)
+    return result
+
+
+def _with_fresh_ids(resources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Копия сметы с новыми id: закэшированный результат не делит идентификаторы между проектами."""
+    return [{**r, "id": f"ai-res-{uuid.uuid4().hex[:6]}"} for r in resources]
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {
+        "estimates": _estimate_cache.stats(),
+        "prices": _price_cache.stats(),
+        "inflight": len(_inflight),
+        "search_backend": type(_search_backend).__name__ if _search_backend else None,
+    }
+
+
 async def estimate_resources_with_ai(description: str) -> List[Dict[str, Any]]:
     """
     1. Анализирует описание проекта через LLM для получения списка ресурсов.
     2. Ищет цены на эти ресурсы в интернете через DuckDuckGo.
     3. Формирует итоговую смету (название, цена, количество, поставщик) с помощью LLM.
+
+    Результат кэшируется по хешу нормализованного описания, одинаковые параллельные
+    вызовы объединяются в один расчёт.
     """
-    
+    key = cache_key(description)
+    cached = await run_in_threadpool(get_cached, "estimate", _estimate_cache, key, AI_CACHE_PERSIST)
+    if cached is not None:
+        return _with_fresh_ids(cached)
+
+    # shield: отмена одного из ожидающих запросов не отменяет общий расчёт
+    return _with_fresh_ids(await asyncio.shield(_estimate_run(description, key).result))
+
+
+async def estimate_resources_stream(description: str) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Та же смета, но по фазам, чтобы клиент видел прогресс:
+    ("items", [позиции]) после шага 1, ("price", {"item", "result"}) по мере завершения
+    каждого поиска и ("estimate", [ресурсы]) в конце. Из кэша сразу приходит только estimate.
+    Подключившийся к уже идущему расчёту сначала получает накопленные фазы.
+    """
+    key = cache_key(description)
+    cached = await run_in_threadpool(get_cached, "estimate", _estimate_cache, key, AI_CACHE_PERSIST)
+    if cached is not None:
+        yield "estimate", _with_fresh_ids(cached)
+        return
+    async for name, data in _estimate_run(description, key).subscribe():
+        yield name, _with_fresh_ids(data) if name == "estimate" else data
+
+
+def _estimate_run(description: str, key: str) -> "_EstimateRun":
+    run = _inflight.get(key)
+    if run is None:
+        run = _EstimateRun(description, key)
+        _inflight[key] = run
+        run.result.add_done_callback(lambda _: _inflight.pop(key, None))
+    return run
+
+
+class _EstimateRun:
+    """
+    Один расчёт сметы на ключ. Фазы копятся в events и раздаются всем подписчикам,
+    в том числе подключившимся позже; итоговая смета — в result. Отмена подписчика
+    не отменяет сам расчёт.
+    """
+
+    def __init__(self, description: str, key: str):
+        self.events: List[Tuple[str, Any]] = []
+        self.result: "asyncio.Future[List[Dict[str, Any]]]" = asyncio.get_running_loop().create_future()
+        # Ошибку расчёта получают подписчики; без них она не должна попадать в лог как «never retrieved»
+        self.result.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._updated = asyncio.Event()
+        self._task = asyncio.ensure_future(self._produce(description, key))
+
+    def _notify(self):
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def _produce(self, description: str, key: str):
+        resources: List[Dict[str, Any]] = []
+        try:
+            async for name, data in _estimate_pipeline(description, key):
+                if name == "estimate":
+                    resources = data
+                self.events.append((name, data))
+                self._notify()
+        except asyncio.CancelledError:
+            self.result.cancel()
+            raise
+        except Exception as e:
+            self.result.set_exception(e)
+        else:
+            self.result.set_result(resources)
+        finally:
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Tuple[str, Any]]:
+        sent = 0
+        while True:
+            updated = self._updated
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.result.done():
+                self.result.result()  # пробрасывает ошибку расчёта
+                return
+            await updated.wait()
+
+
+async def _estimate_pipeline(description: str, key: str) -> AsyncIterator[Tuple[str, Any]]:
     api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or not AsyncOpenAI or not DDGS:
+    if not api_key or not AsyncOpenAI or _search_backend is None:
         print("ВНИМАНИЕ: Нет OPENAI_API_KEY или не установлены openai / duckduckgo_search. Возвращаем моковые данные.")
         # Если ключа или библиотек нет, возвращаем заглушку (fallback)
-        return [
+        yield "estimate", [
             {"id": str(uuid.uuid4()), "name": "Игровое оборудование", "quantity": 5, "unit": "шт.", "estimatedCost": 30000, "supplier": "СпортОбъект"},
             {"id": str(uuid.uuid4()), "name": "Резиновое покрытие", "quantity": 100, "unit": "м²", "estimatedCost": 2500, "supplier": "Леруа Мерлен"},
         ]
+        return
     
     client = AsyncOpenAI(api_key=api_key)
     
@@ -41,6 +268,9 @@ async def estimate_resources_with_ai(description: str) -> List[Dict[str, Any]]:
     Верни только JSON объект с полем "items", содержащим массив.
     """
     
+    # Смета по заглушечным позициям не кэшируется: иначе неудачный шаг 1 закрепится на неделю
+    fallback_items = ["строительные материалы", "услуги монтажа"]
+    degraded = False
     try:
         response1 = await client.chat.completions.create(
             model="gpt-4o-mini",
@@ -49,26 +279,28 @@ async def estimate_resources_with_ai(description: str) -> List[Dict[str, Any]]:
         )
         
         items_data = json.loads(response1.choices[0].message.content)
-        items = items_data.get("items", ["строительные материалы", "услуги монтажа"])
+        items = items_data.get("items")
+        if not isinstance(items, list) or not items:
+            items = fallback_items
+            degraded = True
             
     except Exception as e:
         print("Ошибка извлечения ресурсов:", e)
-        items = ["строительные материалы", "услуги монтажа"]
+        items = fallback_items
+        degraded = True
 
-    # Шаг 2: Поиск цен в интернете
-    def search_sync(item):
-        try:
-            ddgs = DDGS()
-            results = ddgs.text(f"купить {item} цена интернет магазин", region='ru-ru', max_results=3)
-            snippets = [r.get('body', '') for r in results]
-            return f"Товар: {item}. Найденные данные в сети: " + " | ".join(snippets)
-        except Exception:
-            return f"Товар: {item}. Информации о ценах не найдено."
-
-    # Выполняем поиск параллельно
-    loop = asyncio.get_event_loop()
-    tasks = [loop.run_in_executor(None, search_sync, item) for item in items[:5]]
-    search_results = await asyncio.gather(*tasks)
+    items = [str(item) for item in items[:5]]
+    yield "items", items
+
+    # Шаг 2: Поиск цен в интернете (параллельно, в выделенном пуле); отдаём по мере готовности
+    async def indexed_search(i: int, item: str):
+        return i, await search_prices(item)
+
+    search_results = [""] * len(items)
+    for next_done in asyncio.as_completed([indexed_search(i, item) for i, item in enumerate(items)]):
+        i, result = await next_done
+        search_results[i] = result
+        yield "price", {"item": items[i], "result": result}
     
     context_str = "\n".join(search_results)
     
@@ -112,10 +344,12 @@ async def estimate_resources_with_ai(description: str) -> List[Dict[str, Any]]:
             r["quantity"] = float(r.get("quantity", 1))
             r["supplier"] = r.get("supplier", "Неизвестно")
             
-        return resources
+        if not degraded:
+            await run_in_threadpool(remember, "estimate", _estimate_cache, key, resources, AI_CACHE_PERSIST)
     except Exception as e:
         print("Ошибка составления сметы:", e)
         # Fallback
-        return [
+        resources = [
             {"id": str(uuid.uuid4()), "name": "Не удалось сгенерировать точную смету", "quantity": 1, "unit": "шт.", "estimatedCost": 0, "supplier": "-"}
         ]
+    yield "estimate", resources
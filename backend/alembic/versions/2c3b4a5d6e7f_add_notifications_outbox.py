@@ -0,0 +1,49 @@
+"""add notifications outbox
+
+Revision ID: 2c3b4a5d6e7f
+Revises: 5e4d3c2b1a09
+Create Date: 2026-04-24
+
+Уведомления пишутся в одной транзакции с изменением состояния и рассылаются
+диспетчером (notifications.py); клиент догружает пропущенные по курсору since=.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "2c3b4a5d6e7f"
+down_revision: Union[str, Sequence[str], None] = "5e4d3c2b1a09"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notifications",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "user_id",
+            sa.String(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("dispatched_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_notifications_user_id_id", "notifications", ["user_id", "id"], unique=False)
+    op.create_index(
+        "ix_notifications_undispatched",
+        "notifications",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("dispatched_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notifications_undispatched", table_name="notifications")
+    op.drop_index("ix_notifications_user_id_id", table_name="notifications")
+    op.drop_table("notifications")
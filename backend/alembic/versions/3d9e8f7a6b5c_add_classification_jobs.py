@@ -0,0 +1,52 @@
+"""add classification_jobs
+
+Revision ID: 3d9e8f7a6b5c
+Revises: 7c1d2e3f4a5b
+Create Date: 2026-04-22
+
+Очередь фоновой классификации категории проекта (jobs.py): пишется в одной
+транзакции с публикацией проекта и переживает рестарт процесса.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "3d9e8f7a6b5c"
+down_revision: Union[str, Sequence[str], None] = "7c1d2e3f4a5b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "classification_jobs",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column(
+            "project_id",
+            sa.String(),
+            sa.ForeignKey("projects.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_classification_jobs_project_id", "classification_jobs", ["project_id"], unique=False)
+    op.create_index(
+        "ix_classification_jobs_status_next_attempt",
+        "classification_jobs",
+        ["status", "next_attempt_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_classification_jobs_status_next_attempt", table_name="classification_jobs")
+    op.drop_index("ix_classification_jobs_project_id", table_name="classification_jobs")
+    op.drop_table("classification_jobs")
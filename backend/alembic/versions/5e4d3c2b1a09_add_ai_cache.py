@@ -0,0 +1,32 @@
+"""add ai_cache
+
+Revision ID: 5e4d3c2b1a09
+Revises: 9b8a7c6d5e4f
+Create Date: 2026-04-24
+
+Кэш ai_service: сметы по хешу описания и результаты поиска цен по позиции.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "5e4d3c2b1a09"
+down_revision: Union[str, Sequence[str], None] = "9b8a7c6d5e4f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ai_cache",
+        sa.Column("namespace", sa.String(), primary_key=True),
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("value", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ai_cache")
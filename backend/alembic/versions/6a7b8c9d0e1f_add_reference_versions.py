@@ -0,0 +1,32 @@
+"""add reference_versions
+
+Revision ID: 6a7b8c9d0e1f
+Revises: 2c3b4a5d6e7f
+Create Date: 2026-04-25
+
+Штамп версии справочников (настройки, шаблоны, база знаний, ресурсы): воркеры
+сверяют его и перечитывают кэш reference.py только после изменения данных.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "6a7b8c9d0e1f"
+down_revision: Union[str, Sequence[str], None] = "2c3b4a5d6e7f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "reference_versions",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("version", sa.String(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("reference_versions")
@@ -0,0 +1,40 @@
+"""add projects (created_at, id) index for keyset pagination
+
+Revision ID: 7c1d2e3f4a5b
+Revises: f1a2b3c4d5e6
+Create Date: 2026-04-21
+
+Списки проектов пагинируются по ключу (created_at, id); строки без created_at
+(например, заведённые seed.py до этой ревизии) получают его из createdAt. Строки, где
+createdAt не начинается с даты YYYY-MM-DD, получают now(): приведение мусора к
+timestamptz прервало бы всю миграцию.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "7c1d2e3f4a5b"
+down_revision: Union[str, Sequence[str], None] = "f1a2b3c4d5e6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        UPDATE projects
+        SET created_at = COALESCE(
+            CASE WHEN "createdAt" ~ '^\\d{4}-\\d{2}-\\d{2}' THEN left("createdAt", 10)::date::timestamptz END,
+            now()
+        )
+        WHERE created_at IS NULL;
+        """
+    )
+    op.execute("UPDATE projects SET updated_at = created_at WHERE updated_at IS NULL")
+    op.create_index("ix_projects_created_at_id", "projects", ["created_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_projects_created_at_id", table_name="projects")
@@ -0,0 +1,113 @@
+"""normalize project members and requests
+
+Revision ID: 8d9e0f1a2b3c
+Revises: 6a7b8c9d0e1f
+Create Date: 2026-04-26
+
+JSON-массивы projects.participants / pendingJoinRequests / ngoPartnerRequests переезжают
+в таблицы project_members, project_join_requests и project_partner_requests с ключом по
+id пользователя. В массивах лежали имена (в моках — и id): элемент сопоставляется сначала
+с users.id, затем с users.name (при однофамильцах — первый по id). Элементы, которым не
+нашлось пользователя, не переносятся. Порядок массива сохраняется через created_at.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "8d9e0f1a2b3c"
+down_revision: Union[str, Sequence[str], None] = "6a7b8c9d0e1f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _user_rows(column: str) -> str:
+    """SELECT (project_id, user_id, created_at) из JSON-массива имён/id в projects.<column>."""
+    return f"""
+        SELECT DISTINCT ON (p.id, u.id)
+            p.id, u.id, COALESCE(p.created_at, now()) + e.ord * interval '1 millisecond'
+        FROM projects p
+        CROSS JOIN LATERAL json_array_elements_text(
+            CASE WHEN json_typeof(p."{column}"::json) = 'array' THEN p."{column}"::json ELSE '[]'::json END
+        ) WITH ORDINALITY AS e(value, ord)
+        JOIN LATERAL (
+            SELECT users.id FROM users
+            WHERE users.id = e.value OR users.name = e.value
+            ORDER BY (users.id = e.value) DESC, users.id
+            LIMIT 1
+        ) u ON true
+        ORDER BY p.id, u.id, e.ord
+    """
+
+
+def upgrade() -> None:
+    for table in ("project_members", "project_join_requests"):
+        op.create_table(
+            table,
+            sa.Column("project_id", sa.String(), sa.ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index(f"ix_{table}_user_id", table, ["user_id"])
+    op.create_table(
+        "project_partner_requests",
+        sa.Column("project_id", sa.String(), sa.ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("npo_id", sa.String(), primary_key=True),
+        sa.Column("npo_name", sa.String(), nullable=False),
+        sa.Column("message", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_project_partner_requests_npo_id", "project_partner_requests", ["npo_id"])
+
+    op.execute(f"INSERT INTO project_members (project_id, user_id, created_at) {_user_rows('participants')}")
+    op.execute(f"INSERT INTO project_join_requests (project_id, user_id, created_at) {_user_rows('pendingJoinRequests')}")
+    op.execute(
+        """
+        INSERT INTO project_partner_requests (project_id, npo_id, npo_name, message, created_at)
+        SELECT DISTINCT ON (p.id, e.value->>'npoId')
+            p.id, e.value->>'npoId', COALESCE(e.value->>'npoName', ''), e.value->>'message',
+            COALESCE(p.created_at, now()) + e.ord * interval '1 millisecond'
+        FROM projects p
+        CROSS JOIN LATERAL json_array_elements(
+            CASE WHEN json_typeof(p."ngoPartnerRequests"::json) = 'array' THEN p."ngoPartnerRequests"::json ELSE '[]'::json END
+        ) WITH ORDINALITY AS e(value, ord)
+        WHERE json_typeof(e.value) = 'object' AND e.value->>'npoId' IS NOT NULL
+        ORDER BY p.id, e.value->>'npoId', e.ord
+        """
+    )
+
+    op.drop_column("projects", "participants")
+    op.drop_column("projects", "pendingJoinRequests")
+    op.drop_column("projects", "ngoPartnerRequests")
+
+
+def downgrade() -> None:
+    op.add_column("projects", sa.Column("participants", sa.JSON(), nullable=True))
+    op.add_column("projects", sa.Column("pendingJoinRequests", sa.JSON(), nullable=True))
+    op.add_column("projects", sa.Column("ngoPartnerRequests", sa.JSON(), nullable=True))
+    op.execute(
+        """
+        UPDATE projects p SET
+            participants = COALESCE((
+                SELECT json_agg(u.name ORDER BY m.created_at)
+                FROM project_members m JOIN users u ON u.id = m.user_id
+                WHERE m.project_id = p.id
+            ), '[]'::json),
+            "pendingJoinRequests" = COALESCE((
+                SELECT json_agg(u.name ORDER BY r.created_at)
+                FROM project_join_requests r JOIN users u ON u.id = r.user_id
+                WHERE r.project_id = p.id
+            ), '[]'::json),
+            "ngoPartnerRequests" = COALESCE((
+                SELECT json_agg(json_build_object('npoId', r.npo_id, 'npoName', r.npo_name, 'message', r.message) ORDER BY r.created_at)
+                FROM project_partner_requests r
+                WHERE r.project_id = p.id
+            ), '[]'::json)
+        """
+    )
+    op.drop_index("ix_project_partner_requests_npo_id", table_name="project_partner_requests")
+    op.drop_table("project_partner_requests")
+    for table in ("project_join_requests", "project_members"):
+        op.drop_index(f"ix_{table}_user_id", table_name=table)
+        op.drop_table(table)
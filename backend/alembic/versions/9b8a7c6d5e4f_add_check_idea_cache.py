@@ -0,0 +1,31 @@
+"""add check_idea_cache
+
+Revision ID: 9b8a7c6d5e4f
+Revises: 3d9e8f7a6b5c
+Create Date: 2026-04-23
+
+Кэш ответов check-idea по sha256 нормализованного описания.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "9b8a7c6d5e4f"
+down_revision: Union[str, Sequence[str], None] = "3d9e8f7a6b5c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "check_idea_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("response", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("check_idea_cache")
@@ -0,0 +1,31 @@
+"""add projects published initiator index
+
+Revision ID: a9b0c1d2e3f4
+Revises: f8a9b0c1d2e3
+Create Date: 2026-05-02
+
+Лента проектов автора (initiator_id=) — опубликованные проекты одного инициатора в порядке
+created_at DESC, id DESC. Частичный индекс ("initiatorId", created_at, id) по status <> 'DRAFT'
+отдаёт страницу без сортировки и без чтения чужих проектов и черновиков.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a9b0c1d2e3f4"
+down_revision: Union[str, Sequence[str], None] = "f8a9b0c1d2e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_projects_published_initiator_created_at_id "
+        "ON projects (\"initiatorId\", created_at, id) WHERE status <> 'DRAFT'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_projects_published_initiator_created_at_id")
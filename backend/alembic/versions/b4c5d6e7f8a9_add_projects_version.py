@@ -0,0 +1,27 @@
+"""add projects.version
+
+Revision ID: b4c5d6e7f8a9
+Revises: 8d9e0f1a2b3c
+Create Date: 2026-04-27
+
+Счётчик правок черновика: автосохранение мастера (PATCH /api/projects/drafts/{id}/autosave)
+пишет поверх ожидаемой версии и увеличивает её в том же UPDATE.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b4c5d6e7f8a9"
+down_revision: Union[str, Sequence[str], None] = "8d9e0f1a2b3c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("projects", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "version")
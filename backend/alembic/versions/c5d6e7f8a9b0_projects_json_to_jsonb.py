@@ -0,0 +1,58 @@
+"""projects json columns to jsonb with gin indexes
+
+Revision ID: c5d6e7f8a9b0
+Revises: b4c5d6e7f8a9
+Create Date: 2026-04-28
+
+JSON-колонки projects переводятся в JSONB: его можно индексировать и сравнивать.
+GIN-индексы — под фильтры GET /api/projects: resource_category (resources @> ...) и
+detected_object ((image_analysis -> 'detected_objects') @> ...). Участники проекта уже
+лежат в project_members, для них отдельный индекс не нужен.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "c5d6e7f8a9b0"
+down_revision: Union[str, Sequence[str], None] = "b4c5d6e7f8a9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JSON_COLUMNS = (
+    "coordinates",
+    "resources",
+    "image_analysis",
+    "photos",
+    "project_photos",
+    "analysis_photos",
+    "polygon",
+)
+
+
+def upgrade() -> None:
+    for column in JSON_COLUMNS:
+        op.alter_column(
+            "projects",
+            column,
+            type_=postgresql.JSONB(),
+            existing_type=sa.JSON(),
+            postgresql_using=f"{column}::jsonb",
+        )
+    op.execute("CREATE INDEX ix_projects_resources ON projects USING gin (resources jsonb_path_ops)")
+    op.execute("CREATE INDEX ix_projects_detected_objects ON projects USING gin ((image_analysis -> 'detected_objects'))")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_projects_detected_objects", table_name="projects")
+    op.drop_index("ix_projects_resources", table_name="projects")
+    for column in JSON_COLUMNS:
+        op.alter_column(
+            "projects",
+            column,
+            type_=sa.JSON(),
+            existing_type=postgresql.JSONB(),
+            postgresql_using=f"{column}::json",
+        )
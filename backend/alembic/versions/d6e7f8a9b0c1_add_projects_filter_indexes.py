@@ -0,0 +1,41 @@
+"""add projects filter indexes
+
+Revision ID: d6e7f8a9b0c1
+Revises: c5d6e7f8a9b0
+Create Date: 2026-04-29
+
+Индексы под частые фильтры списков: частичный (created_at, id) для опубликованных
+проектов, частичный ("initiatorId", updated_at) для черновиков автора и ("npoId", status)
+для проектов НКО. Планы запросов проверяет explain_check.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d6e7f8a9b0c1"
+down_revision: Union[str, Sequence[str], None] = "c5d6e7f8a9b0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_projects_published_created_at_id "
+        "ON projects (created_at, id) WHERE status <> 'DRAFT'"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_projects_drafts_initiator_updated_at "
+        "ON projects (\"initiatorId\", updated_at) WHERE status = 'DRAFT'"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_projects_npo_id_status "
+        "ON projects (\"npoId\", status)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_projects_npo_id_status")
+    op.execute("DROP INDEX IF EXISTS ix_projects_drafts_initiator_updated_at")
+    op.execute("DROP INDEX IF EXISTS ix_projects_published_created_at_id")
@@ -0,0 +1,46 @@
+"""merge check_idea_cache into ai_cache
+
+Revision ID: e7f8a9b0c1d2
+Revises: d6e7f8a9b0c1
+Create Date: 2026-04-30
+
+Ответы check-idea переезжают в общую таблицу ai_cache под namespace check_idea: ключ
+(sha256 нормализованного описания) считается так же, как у остальных namespace.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e7f8a9b0c1d2"
+down_revision: Union[str, Sequence[str], None] = "d6e7f8a9b0c1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        INSERT INTO ai_cache (namespace, key, value, created_at)
+        SELECT 'check_idea', key, response, created_at FROM check_idea_cache
+        ON CONFLICT (namespace, key) DO NOTHING
+        """
+    )
+    op.drop_table("check_idea_cache")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "check_idea_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("response", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.execute(
+        """
+        INSERT INTO check_idea_cache (key, response, created_at)
+        SELECT key, value, created_at FROM ai_cache WHERE namespace = 'check_idea'
+        """
+    )
+    op.execute("DELETE FROM ai_cache WHERE namespace = 'check_idea'")
@@ -0,0 +1,30 @@
+"""add projects geom geography index
+
+Revision ID: f1a2b3c4d5e6
+Revises: a4b5c6d7e8f9
+Create Date: 2026-04-20
+
+Функциональный GiST-индекс по geom::geography, чтобы ST_DWithin в метрах
+(фильтр по радиусу в GET /api/projects) шёл по индексу, а не по всей таблице.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f1a2b3c4d5e6"
+down_revision: Union[str, Sequence[str], None] = "a4b5c6d7e8f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_projects_geom_geography "
+        "ON projects USING gist (geography(geom))"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_projects_geom_geography")
@@ -0,0 +1,51 @@
+"""projects.created_at not null
+
+Revision ID: f8a9b0c1d2e3
+Revises: e7f8a9b0c1d2
+Create Date: 2026-05-01
+
+Ленты проектов листаются keyset-курсором по (created_at, id) DESC: строки с NULL в
+created_at шли первыми и давали курсор [null, id], после которого сравнение кортежей
+ничего не находит. Пустые значения заполняются из строкового "createdAt" (YYYY-MM-DD),
+иначе из updated_at или текущего времени; колонка становится NOT NULL с DEFAULT now().
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f8a9b0c1d2e3"
+down_revision: Union[str, Sequence[str], None] = "e7f8a9b0c1d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        UPDATE projects SET created_at = COALESCE(
+            CASE WHEN "createdAt" ~ '^\\d{4}-\\d{2}-\\d{2}' THEN left("createdAt", 10)::date::timestamptz END,
+            updated_at,
+            now()
+        )
+        WHERE created_at IS NULL
+        """
+    )
+    op.alter_column(
+        "projects",
+        "created_at",
+        existing_type=sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.text("now()"),
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "projects",
+        "created_at",
+        existing_type=sa.DateTime(timezone=True),
+        nullable=True,
+        server_default=None,
+    )
@@ -0,0 +1,238 @@
+"""
+Нагрузочный прогон против запущенного API (по умолчанию http://localhost:4000).
+
+    python bench.py throughput --concurrency 50 --requests 1000
+    python bench.py login-storm --concurrency 50 --requests 500
+    python bench.py join-storm --concurrency 50 --requests 400
+
+Сценарии:
+  throughput  — параллельные GET /api/projects/drafts и GET /api/projects,
+                печатает req/s и p50/p95/p99 по каждому эндпоинту.
+  login-storm — пачка параллельных POST /api/auth/login; одновременно раз в 50 мс
+                опрашивается GET /api/admin/settings. Латентность опроса до и во время
+                шторма показывает, держат ли остальные эндпоинты время ответа.
+  join-storm  — новый проект, на который параллельно шлют POST /join (каждый пользователь
+                дважды) и POST /partner-request (каждая НКО дважды). Затем сверяет, что в
+                проекте ровно столько заявок, сколько уникальных отправителей (нет потерянных
+                записей и дублей), и что p99 не выше --max-p99. Код выхода 1 при нарушении.
+                Пользователи регистрируются заново на каждый прогон (bench-<run>-<i>@example.com).
+
+Для сравнения «до/после» запускать на одной и той же базе (seed.py) и одном воркере uvicorn.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_EMAIL = "citizen@example.com"
+DEFAULT_PASSWORD = "password123"
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _report(title: str, latencies: Dict[str, List[float]], errors: int, elapsed: float):
+    total = sum(len(v) for v in latencies.values())
+    print(f"\n== {title} ==")
+    print(f"запросов: {total}, ошибок: {errors}, время: {elapsed:.2f} с, {total / elapsed:.1f} req/s")
+    for name, values in latencies.items():
+        if not values:
+            continue
+        ms = [v * 1000 for v in values]
+        print(
+            f"  {name:<28} n={len(ms):<5} p50={statistics.median(ms):7.1f} мс "
+            f"p95={_percentile(ms, 95):7.1f} мс p99={_percentile(ms, 99):7.1f} мс"
+        )
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    resp = await client.post("/api/auth/login", json={"email": email, "password": password})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def run_throughput(base_url: str, concurrency: int, requests: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        token = await _login(client, DEFAULT_EMAIL, DEFAULT_PASSWORD)
+        headers = {"Authorization": f"Bearer {token}"}
+        endpoints = ["/api/projects/drafts", "/api/projects"]
+        latencies: Dict[str, List[float]] = {e: [] for e in endpoints}
+        errors = 0
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i: int):
+            nonlocal errors
+            path = endpoints[i % len(endpoints)]
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    resp = await client.get(path, headers=headers)
+                    resp.raise_for_status()
+                    latencies[path].append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        _report("throughput", latencies, errors, time.perf_counter() - started)
+
+
+async def run_login_storm(base_url: str, concurrency: int, requests: int):
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        probe_path = "/api/admin/settings"
+
+        async def probe(samples: List[float], stop: asyncio.Event):
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    (await client.get(probe_path)).raise_for_status()
+                    samples.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.05)
+
+        # Базовая латентность без нагрузки
+        baseline: List[float] = []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(baseline, stop))
+        await asyncio.sleep(2.0)
+        stop.set()
+        await probe_task
+
+        during: List[float] = []
+        logins: List[float] = []
+        errors = 0
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal errors
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    await _login(client, DEFAULT_EMAIL, DEFAULT_PASSWORD)
+                    logins.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(during, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+        _report(
+            "login-storm",
+            {
+                "POST /api/auth/login": logins,
+                f"{probe_path} (до)": baseline,
+                f"{probe_path} (во время)": during,
+            },
+            errors,
+            elapsed,
+        )
+        print((await client.get("/api/admin/metrics")).json())
+
+
+async def run_join_storm(base_url: str, concurrency: int, requests: int, max_p99_ms: float) -> bool:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        token = await _login(client, DEFAULT_EMAIL, DEFAULT_PASSWORD)
+        resp = await client.post(
+            "/api/projects",
+            json={"title": "bench join-storm", "description": "", "status": "ACTIVE"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        resp.raise_for_status()
+        project_id = resp.json()["id"]
+
+        run = uuid.uuid4().hex[:8]
+        users = max(1, requests // 4)
+        npos = max(1, requests // 4)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def register(i: int) -> str:
+            async with sem:
+                resp = await client.post("/api/auth/register", json={
+                    "email": f"bench-{run}-{i}@example.com",
+                    "password": DEFAULT_PASSWORD,
+                    "role": "initiator",
+                    "name": f"Bench {run} {i}",
+                })
+                resp.raise_for_status()
+                return resp.json()["access_token"]
+
+        tokens = await asyncio.gather(*(register(i) for i in range(users)))
+
+        latencies: Dict[str, List[float]] = {"POST /join": [], "POST /partner-request": []}
+        errors = 0
+
+        async def one(name: str, path: str, **kwargs):
+            nonlocal errors
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    (await client.post(path, **kwargs)).raise_for_status()
+                    latencies[name].append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        calls = []
+        for _ in range(2):
+            calls += [
+                one("POST /join", f"/api/projects/{project_id}/join", headers={"Authorization": f"Bearer {t}"})
+                for t in tokens
+            ]
+            calls += [
+                one("POST /partner-request", f"/api/projects/{project_id}/partner-request", json={
+                    "npoId": f"bench-{run}-npo-{i}", "npoName": f"НКО {i}", "message": "bench",
+                })
+                for i in range(npos)
+            ]
+        started = time.perf_counter()
+        await asyncio.gather(*calls)
+        _report("join-storm", latencies, errors, time.perf_counter() - started)
+
+        project = (await client.get(f"/api/projects/{project_id}")).json()
+        pending = len(project["pendingJoinRequests"])
+        partners = len(project["ngoPartnerRequests"])
+        p99 = _percentile([v * 1000 for v in latencies["POST /join"] + latencies["POST /partner-request"]], 99)
+        print(f"проект {project_id}: заявок на участие {pending}/{users}, запросов партнёрства {partners}/{npos}")
+        ok = errors == 0 and pending == users and partners == npos and p99 <= max_p99_ms
+        print(f"p99 {p99:.1f} мс (порог {max_p99_ms:.0f} мс): {'OK' if ok else 'FAIL'}")
+        return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=["throughput", "login-storm", "join-storm"])
+    parser.add_argument("--base-url", default="http://localhost:4000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--max-p99", type=float, default=1000.0, help="порог p99 в мс для join-storm")
+    args = parser.parse_args()
+
+    if args.scenario == "throughput":
+        asyncio.run(run_throughput(args.base_url, args.concurrency, args.requests))
+    elif args.scenario == "login-storm":
+        asyncio.run(run_login_storm(args.base_url, args.concurrency, args.requests))
+    elif args.scenario == "join-storm":
+        if not asyncio.run(run_join_storm(args.base_url, args.concurrency, args.requests, args.max_p99)):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
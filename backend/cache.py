@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Optional
+
+import database
+from models import DBAICache
+
+# Как часто (в секундах) запись в ai_cache заодно удаляет просроченные строки своего namespace
+AI_CACHE_PURGE_INTERVAL = float(os.getenv("AI_CACHE_PURGE_INTERVAL", "3600"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кэш с временем жизни записей.
+    Обращения идут и из event loop, и из пула потоков FastAPI, поэтому все операции под замком.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# --- Кэш в таблице ai_cache ---
+# Общий для воркеров и переживает рестарт. Namespace разделяет кэши: estimate и price
+# (ai_service), check_idea (check_idea_client). Срок жизни строки — ttl кэша в памяти.
+
+_last_purge: Dict[str, float] = {}
+_purge_lock = threading.Lock()
+
+
+def cache_key(text: str) -> str:
+    """sha256 нормализованного текста: регистр и пробелы не влияют на ключ."""
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def get_cached(namespace: str, memory: TTLCache, key: str, persist: bool = True) -> Optional[Any]:
+    value = memory.get(key)
+    if value is not None or not persist:
+        return value
+    try:
+        with database.SessionLocal() as db:
+            row = (
+                db.query(DBAICache)
+                .filter(DBAICache.namespace == namespace, DBAICache.key == key)
+                .first()
+            )
+            if row is None or row.created_at < datetime.now(timezone.utc) - timedelta(seconds=memory.ttl):
+                return None
+            value = row.value
+    except Exception as e:
+        print(f"Ошибка чтения кэша {namespace}: {e}")
+        return None
+    memory.set(key, value)
+    return value
+
+
+def remember(namespace: str, memory: TTLCache, key: str, value: Any, persist: bool = True):
+    memory.set(key, value)
+    if not persist:
+        return
+    try:
+        with database.SessionLocal() as db:
+            db.merge(DBAICache(namespace=namespace, key=key, value=value, created_at=datetime.now(timezone.utc)))
+            db.commit()
+    except Exception as e:
+        print(f"Ошибка записи кэша {namespace}: {e}")
+        return
+    if _purge_due(namespace):
+        purge_expired(namespace, memory.ttl)
+
+
+def _purge_due(namespace: str) -> bool:
+    now = time.monotonic()
+    with _purge_lock:
+        last = _last_purge.get(namespace)
+        if last is not None and now - last < AI_CACHE_PURGE_INTERVAL:
+            return False
+        _last_purge[namespace] = now
+        return True
+
+
+def purge_expired(namespace: str, ttl: float) -> int:
+    """Удаляет строки namespace старше ttl; возвращает число удалённых."""
+    try:
+        with database.SessionLocal() as db:
+            deleted = (
+                db.query(DBAICache)
+                .filter(
+                    DBAICache.namespace == namespace,
+                    DBAICache.created_at < datetime.now(timezone.utc) - timedelta(seconds=ttl),
+                )
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            return deleted
+    except Exception as e:
+        print(f"Ошибка очистки кэша {namespace}: {e}")
+        return 0
@@ -0,0 +1,175 @@
+"""
+Общий HTTP-клиент сервиса check-idea (классификация идей проектов).
+
+Один httpx.AsyncClient на процесс с keep-alive пулом вместо нового соединения на
+каждый вызов, ограничение числа одновременных запросов и circuit breaker:
+если сервис падает или тормозит, вызовы сразу отклоняются и не копят сокеты.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from cache import TTLCache, cache_key, get_cached, remember
+
+CHECK_IDEA_BASE_URL = os.getenv("CHECK_IDEA_BASE_URL", "http://26.217.14.46:8000")
+CHECK_IDEA_TIMEOUT = float(os.getenv("CHECK_IDEA_TIMEOUT", "10"))
+CHECK_IDEA_MAX_CONNECTIONS = int(os.getenv("CHECK_IDEA_MAX_CONNECTIONS", "20"))
+CHECK_IDEA_MAX_CONCURRENCY = int(os.getenv("CHECK_IDEA_MAX_CONCURRENCY", "20"))
+CHECK_IDEA_QUEUE_TIMEOUT = float(os.getenv("CHECK_IDEA_QUEUE_TIMEOUT", "2"))
+CHECK_IDEA_FAILURE_THRESHOLD = int(os.getenv("CHECK_IDEA_FAILURE_THRESHOLD", "5"))
+CHECK_IDEA_RESET_TIMEOUT = float(os.getenv("CHECK_IDEA_RESET_TIMEOUT", "30"))
+CHECK_IDEA_CACHE_SIZE = int(os.getenv("CHECK_IDEA_CACHE_SIZE", "5000"))
+CHECK_IDEA_CACHE_TTL = float(os.getenv("CHECK_IDEA_CACHE_TTL", str(24 * 3600)))
+# Дублировать кэш в таблицу ai_cache (namespace check_idea): общий для воркеров и переживает рестарт
+CHECK_IDEA_CACHE_PERSIST = os.getenv("CHECK_IDEA_CACHE_PERSIST", "1") == "1"
+
+
+class ServiceUnavailableError(Exception):
+    """Вызов не выполнялся: цепь разомкнута или все слоты заняты."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open после failure_threshold подряд неудач; через reset_timeout
+    пропускается один пробный вызов (half-open): успех замыкает цепь, неудача снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probe_in_flight):
+            raise ServiceUnavailableError("check-idea circuit is open")
+        if state == "half-open":
+            self._probe_in_flight = True
+
+    def cancel_probe(self):
+        """Пробный вызов не был выполнен до конца — следующий вызов может стать пробным."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class CheckIdeaClient:
+    def __init__(
+        self,
+        base_url: str = CHECK_IDEA_BASE_URL,
+        timeout: float = CHECK_IDEA_TIMEOUT,
+        max_connections: int = CHECK_IDEA_MAX_CONNECTIONS,
+        max_concurrency: int = CHECK_IDEA_MAX_CONCURRENCY,
+        queue_timeout: float = CHECK_IDEA_QUEUE_TIMEOUT,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker(CHECK_IDEA_FAILURE_THRESHOLD, CHECK_IDEA_RESET_TIMEOUT)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.rejected = 0
+        self.cache = TTLCache(maxsize=CHECK_IDEA_CACHE_SIZE, ttl=CHECK_IDEA_CACHE_TTL)
+        self.persist = CHECK_IDEA_CACHE_PERSIST
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def check_idea(self, idea: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        POST /api/check-idea. Пробрасывает httpx.RequestError / httpx.HTTPStatusError
+        и ServiceUnavailableError, если вызов не был выполнен.
+        """
+        if self._client is None:
+            await self.start()
+        try:
+            self.breaker.before_call()
+        except ServiceUnavailableError:
+            self.rejected += 1
+            raise
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            self.breaker.cancel_probe()
+            raise ServiceUnavailableError("check-idea concurrency limit reached")
+        try:
+            response = await self._client.post(
+                "/api/check-idea",
+                json={"idea": idea},
+                timeout=timeout if timeout is not None else self.timeout,
+            )
+        except httpx.RequestError:
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.cancel_probe()
+            raise
+        finally:
+            self._slots.release()
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+    async def check_idea_cached(self, idea: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """check_idea с кэшем по хешу нормализованного текста (LRU в процессе + таблица ai_cache)."""
+        key = cache_key(idea)
+        result = await run_in_threadpool(get_cached, "check_idea", self.cache, key, self.persist)
+        if result is not None:
+            return result
+        result = await self.check_idea(idea, timeout=timeout)
+        await run_in_threadpool(remember, "check_idea", self.cache, key, result, self.persist)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rejected": self.rejected,
+            "cache": self.cache.stats(),
+        }
+
+
+check_idea_client = CheckIdeaClient()
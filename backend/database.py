@@ -1,11 +1,13 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from models import Base, DBUser, DBProject, DBNPO, DBResource, DBGlobalSettings, DBOpportunity, DBProjectDetails, DBTemplate, DBKnowledgeBaseEntry
+from models import Base, DBUser, DBProject, DBProjectMember, DBProjectPartnerRequest, DBNPO, DBResource, DBGlobalSettings, DBOpportunity, DBProjectDetails, DBTemplate, DBKnowledgeBaseEntry, DBReferenceVersion
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 import os
+import uuid
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,8 +18,15 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("DATABASE_URL не задан")
 
+# Пул соединений; THREADPOOL_SIZE в main.py по умолчанию равен pool_size + max_overflow
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, pool_pre_ping=True
+    SQLALCHEMY_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -88,10 +97,19 @@ def init_db():
             initiatorId="user-1",
             npoId="npo-1",
             createdAt="2024-01-15",
-            participants=["user-1", "user-2"],
-            pendingJoinRequests=["Александр Матросов", "Мария Кюри"],
-            ngoPartnerRequests=[
-                {"npoId": "npo-2", "npoName": "Эко-Наблюдатели", "message": "Мы готовы предоставить волонтеров и экспертов по озеленению."}
+            created_at=datetime(2024, 1, 15, tzinfo=timezone.utc),
+            updated_at=datetime(2024, 1, 15, tzinfo=timezone.utc),
+            members=[
+                DBProjectMember(user_id="user-1", created_at=datetime(2024, 1, 15, tzinfo=timezone.utc)),
+                DBProjectMember(user_id="user-2", created_at=datetime(2024, 1, 16, tzinfo=timezone.utc)),
+            ],
+            partner_requests=[
+                DBProjectPartnerRequest(
+                    npo_id="npo-2",
+                    npo_name="Эко-Наблюдатели",
+                    message="Мы готовы предоставить волонтеров и экспертов по озеленению.",
+                    created_at=datetime(2024, 1, 20, tzinfo=timezone.utc),
+                )
             ]
         ),
         DBProject(
@@ -112,7 +130,9 @@ def init_db():
             initiatorId="user-2",
             npoId="npo-2",
             createdAt="2023-11-20",
-            participants=["user-2", "user-3", "user-4"]
+            created_at=datetime(2023, 11, 20, tzinfo=timezone.utc),
+            updated_at=datetime(2023, 11, 20, tzinfo=timezone.utc),
+            members=[DBProjectMember(user_id="user-2", created_at=datetime(2023, 11, 20, tzinfo=timezone.utc))]
         ),
     ]
     db.add_all(mock_projects)
@@ -198,6 +218,9 @@ def init_db():
     )
     db.add(settings)
 
+    # Штамп версии справочников: воркеры перечитают кэш reference.py
+    db.merge(DBReferenceVersion(name="reference", version=uuid.uuid4().hex, updated_at=datetime.now(timezone.utc)))
+
     db.commit()
     db.close()
 
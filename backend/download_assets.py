@@ -4,10 +4,10 @@ import uuid
 import time
 import random
 
+from storage import storage
+
 # Конфигурация
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_DIR = os.path.join(BASE_DIR, "static", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 CATEGORIES = {
     "проект": ["Project", "Building", "Park", "City"],
@@ -24,13 +24,10 @@ def download_image(category_name, text):
         response = requests.get(url, timeout=10)
         if response.status_code == 200:
             unique_filename = f"{uuid.uuid4()}.jpg"
-            file_path = os.path.join(UPLOAD_DIR, unique_filename)
-            
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+            storage.put_bytes(unique_filename, response.content, "image/jpeg")
             
             print(f"  [+] {category_name} ({text}): {unique_filename}")
-            return f"/static/uploads/{unique_filename}"
+            return storage.url(unique_filename)
     except Exception as e:
         print(f"  [!] Ошибка: {e}")
     return None
@@ -0,0 +1,129 @@
+"""
+Проверка планов основных списочных запросов к projects (регрессия индексов).
+
+    python explain_check.py --rows 50000 --users 1000
+
+В одной транзакции в users и projects добавляются синтетические строки (каждый пятый
+проект — черновик, у трети есть НКО, у всех — смета и image_analysis), выполняется
+ANALYZE, и для запросов, которые строит main (_projects_query, _drafts_query), берётся
+EXPLAIN. Проверка не проходит, если projects читается последовательным сканированием или
+ни один из ожидаемых индексов не используется. В конце транзакция откатывается: данные и
+статистика базы остаются прежними. Нужна база с применёнными миграциями (alembic upgrade head).
+Код выхода 1 при нарушении.
+"""
+import argparse
+import sys
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from database import SessionLocal
+from main import DEFAULT_PAGE_SIZE, PROJECT_SORT_COLUMNS, _drafts_query, _keyset_page, _projects_query
+
+USERS_SQL = """
+    INSERT INTO users (id, email, password, role, name)
+    SELECT 'explain-user-' || g, 'explain-' || g || '@example.invalid', '', 'initiator', 'Explain ' || g
+    FROM generate_series(1, :users) g
+"""
+
+PROJECTS_SQL = """
+    INSERT INTO projects (
+        id, title, description, budget, image, location, coordinates, status, "initiatorId", "npoId",
+        "createdAt", resources, image_analysis, created_at, updated_at, version
+    )
+    SELECT
+        'explain-' || g, 'explain', '', 0, '', '', '{"lat": 56.8, "lng": 60.6}'::jsonb,
+        CASE WHEN g % 5 = 0 THEN 'DRAFT' ELSE (ARRAY['ACTIVE', 'SUCCESS', 'NGO_PARTNERED', 'REJECTED'])[1 + g % 4] END,
+        'explain-user-' || (1 + g % :users),
+        CASE WHEN g % 3 = 0 THEN 'explain-npo-' || (g % 200) END,
+        '2024-01-01',
+        jsonb_build_array(jsonb_build_object('category', 'explain-cat-' || (g % 50), 'quantity', 1)),
+        jsonb_build_object('quality_score', 0.9, 'detected_objects', jsonb_build_array('explain-obj-' || (g % 100))),
+        now() - g * interval '1 minute',
+        now() - g * interval '1 minute',
+        1
+    FROM generate_series(1, :rows) g
+"""
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _walk(plan: Dict[str, Any], seq_scans: List[str], indexes: List[str]):
+    if plan.get("Node Type") == "Seq Scan":
+        seq_scans.append(plan.get("Relation Name"))
+    if plan.get("Index Name"):
+        indexes.append(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        _walk(child, seq_scans, indexes)
+
+
+def _page(query):
+    """Первая страница ленты тем же _keyset_page, что и в _list_response."""
+    return _keyset_page(query, PROJECT_SORT_COLUMNS, descending=True, after=None, page_size=DEFAULT_PAGE_SIZE)
+
+
+def _checks(db) -> List[Tuple[str, Any, Tuple[str, ...]]]:
+    return [
+        ("лента проектов", _page(_projects_query(db)),
+         ("ix_projects_published_created_at_id", "ix_projects_created_at_id")),
+        ("initiator_id", _page(_projects_query(db, initiator_id="explain-user-7")),
+         ("ix_projects_published_initiator_created_at_id",)),
+        ("npo_id", _page(_projects_query(db, npo_id="explain-npo-7")),
+         ("ix_projects_npo_id_status", "ix_projects_published_created_at_id")),
+        ("resource_category", _projects_query(db, resource_category="explain-cat-7"),
+         ("ix_projects_resources",)),
+        ("detected_object", _projects_query(db, detected_object="explain-obj-7"),
+         ("ix_projects_detected_objects",)),
+        ("черновики автора", _drafts_query(db, "explain-user-7"),
+         ("ix_projects_drafts_initiator_updated_at",)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    failures = 0
+    db = SessionLocal()
+    try:
+        db.execute(text(USERS_SQL), {"users": args.users})
+        db.execute(text(PROJECTS_SQL), {"rows": args.rows, "users": args.users})
+        db.execute(text("ANALYZE users"))
+        db.execute(text("ANALYZE projects"))
+
+        for name, query, expected in _checks(db):
+            plan = db.execute(_Explain(query.statement)).scalar()[0]["Plan"]
+            seq_scans: List[str] = []
+            indexes: List[str] = []
+            _walk(plan, seq_scans, indexes)
+            ok = "projects" not in seq_scans and any(ix in expected for ix in indexes)
+            failures += not ok
+            used = ", ".join(indexes) or "без индексов"
+            print(f"{'OK  ' if ok else 'FAIL'} {name:<20} {plan['Node Type']}: {used}")
+            if not ok:
+                print(f"     ожидался один из: {', '.join(expected)}")
+    finally:
+        db.rollback()
+        db.close()
+
+    print(f"\nстрок: {args.rows}, пользователей: {args.users}, нарушений: {failures}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
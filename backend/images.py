@@ -0,0 +1,76 @@
+"""
+Уменьшенные варианты загруженных фотографий для списков и карты.
+
+Для загруженного файла строятся WebP-варианты (см. IMAGE_VARIANTS) и кладутся в то же
+хранилище под ключом variants/<variant>/<stem>.webp. Новые загрузки обрабатываются сразу
+после сохранения, а для уже лежащих файлов (seed, старые загрузки) вариант создаётся
+при первом запросе GET /api/images/{variant}/{key} и дальше берётся из хранилища.
+Внешние URL (unsplash и т. п.) не обрабатываются — для них вариантов нет.
+"""
+import io
+import os
+from typing import Dict, List, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+from storage import StorageReadError, storage
+
+# Максимальная сторона в пикселях
+IMAGE_VARIANTS = {"thumb": 480, "medium": 1280}
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+
+
+def variant_key(variant: str, key: str) -> str:
+    return f"variants/{variant}/{os.path.splitext(key)[0]}.webp"
+
+
+def variant_urls(url: Optional[str]) -> Optional[Dict[str, str]]:
+    """URL вариантов для загруженного файла; None для внешних и пустых URL."""
+    key = storage.key_from_url(url)
+    if not key or "/" in key:
+        return None
+    return {variant: f"/api/images/{variant}/{key}" for variant in IMAGE_VARIANTS}
+
+
+def variant_urls_list(urls: Optional[List[str]]) -> List[Optional[Dict[str, str]]]:
+    return [variant_urls(url) for url in urls or []]
+
+
+def build_variant(variant: str, key: str) -> Optional[str]:
+    """
+    Создаёт вариант, если его ещё нет, и возвращает его ключ.
+    None — Pillow не установлен, исходник не прочитан из хранилища или не читается как изображение.
+    Блокирующая функция (хранилище, декодирование и сжатие): вызывать из пула потоков.
+    """
+    target = variant_key(variant, key)
+    if storage.exists(target):
+        return target
+    if Image is None:
+        return None
+    size = IMAGE_VARIANTS[variant]
+    try:
+        data = storage.read(key)
+    except StorageReadError as e:
+        print(f"Не удалось прочитать исходник {key} для варианта {variant}: {e}")
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            image.thumbnail((size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+    except (OSError, ValueError) as e:
+        print(f"Не удалось построить вариант {variant} для {key}: {e}")
+        return None
+    storage.put_bytes(target, out.getvalue(), "image/webp")
+    return target
+
+
+def build_all_variants(key: str):
+    for variant in IMAGE_VARIANTS:
+        build_variant(variant, key)
@@ -0,0 +1,199 @@
+"""
+Фоновая классификация категории проектов через сервис check-idea.
+
+Задания хранятся в таблице classification_jobs и пишутся в той же транзакции,
+что и сам проект, поэтому не теряются при рестарте. Воркер в каждом процессе
+забирает готовые задания через SELECT ... FOR UPDATE SKIP LOCKED, так что
+несколько воркеров uvicorn не обрабатывают одно задание дважды.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+import database
+from models import DBClassificationJob, DBProject
+from notifications import add_notification
+
+MAX_ATTEMPTS = int(os.getenv("CLASSIFICATION_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("CLASSIFICATION_RETRY_BASE", "5"))
+POLL_INTERVAL_SECONDS = float(os.getenv("CLASSIFICATION_POLL_INTERVAL", "5"))
+LEASE_SECONDS = float(os.getenv("CLASSIFICATION_LEASE", "120"))
+BATCH_SIZE = int(os.getenv("CLASSIFICATION_BATCH_SIZE", "10"))
+
+Classifier = Callable[[str], Awaitable[Optional[str]]]
+Notifier = Callable[[], None]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue_classification(db: Session, project_id: str, description: str) -> DBClassificationJob:
+    """Добавляет задание в сессию; коммит — вместе с изменением проекта."""
+    now = _utcnow()
+    job = DBClassificationJob(
+        id=str(uuid.uuid4()),
+        project_id=project_id,
+        description=description,
+        status="pending",
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    return job
+
+
+def _claim_batch(limit: int) -> List[Tuple[str, str, str]]:
+    now = _utcnow()
+    with database.SessionLocal() as db:
+        jobs = (
+            db.query(DBClassificationJob)
+            .filter(
+                or_(
+                    and_(DBClassificationJob.status == "pending", DBClassificationJob.next_attempt_at <= now),
+                    # задание «зависло» у упавшего воркера — забираем после истечения аренды
+                    and_(
+                        DBClassificationJob.status == "running",
+                        DBClassificationJob.updated_at < now - timedelta(seconds=LEASE_SECONDS),
+                    ),
+                )
+            )
+            .order_by(DBClassificationJob.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for job in jobs:
+            job.status = "running"
+            job.attempts = (job.attempts or 0) + 1
+            job.updated_at = now
+        db.commit()
+        return [(job.id, job.project_id, job.description) for job in jobs]
+
+
+def _complete(job_id: str, category: Optional[str]) -> bool:
+    """Сохраняет категорию и уведомление инициатору; True, если уведомление добавлено."""
+    with database.SessionLocal() as db:
+        job = db.query(DBClassificationJob).filter(DBClassificationJob.id == job_id).first()
+        if not job:
+            return False
+        job.status = "done"
+        job.last_error = None
+        job.updated_at = _utcnow()
+        notified = False
+        if category:
+            project = db.query(DBProject).filter(DBProject.id == job.project_id).first()
+            if project:
+                project.type = category
+                add_notification(db, project.initiatorId, {
+                    "type": "project_classified",
+                    "project_id": project.id,
+                    "project_title": project.title,
+                    "category": category,
+                    "message": f"Проекту «{project.title}» присвоена категория «{category}»."
+                })
+                notified = True
+        db.commit()
+        return notified
+
+
+def _fail(job_id: str, error: str):
+    with database.SessionLocal() as db:
+        job = db.query(DBClassificationJob).filter(DBClassificationJob.id == job_id).first()
+        if not job:
+            return
+        now = _utcnow()
+        job.last_error = error[:1000]
+        job.updated_at = now
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = "failed"
+        else:
+            job.status = "pending"
+            job.next_attempt_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+        db.commit()
+
+
+class ClassificationWorker:
+    def __init__(self, classify: Classifier, notify: Notifier):
+        self._classify = classify
+        self._notify = notify
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Будит воркер сразу после постановки задания; можно вызывать из пула потоков."""
+        if self._loop and self._wake:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while True:
+            # Сбрасываем до выборки: wake() во время обработки пачки не потеряется
+            self._wake.clear()
+            try:
+                batch = await run_in_threadpool(_claim_batch, BATCH_SIZE)
+                if batch:
+                    await asyncio.gather(*(self._process(*job) for job in batch))
+                    continue
+            except Exception as e:
+                print(f"Ошибка воркера классификации: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, job_id: str, project_id: str, description: str):
+        try:
+            category = await self._classify(description)
+        except Exception as e:
+            print(f"Ошибка классификации проекта {project_id}: {e}")
+            await run_in_threadpool(_fail, job_id, str(e) or e.__class__.__name__)
+            return
+        if await run_in_threadpool(_complete, job_id, category):
+            self._notify()
+
+
+class Debouncer:
+    """
+    Откладывает вызов на delay секунд; повторный schedule с тем же ключом отменяет
+    ожидающий вызов. Серия автосохранений черновика даёт один запрос к check-idea.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    async def schedule(self, key: str, fn: Callable[..., Awaitable[None]], *args):
+        previous = self._pending.pop(key, None)
+        if previous:
+            previous.cancel()
+        self._pending[key] = asyncio.create_task(self._run_later(key, fn, args))
+
+    async def _run_later(self, key: str, fn: Callable[..., Awaitable[None]], args: tuple):
+        await asyncio.sleep(self.delay)
+        # Уже начатый вызов не отменяется следующим schedule
+        if self._pending.get(key) is asyncio.current_task():
+            del self._pending[key]
+        await fn(*args)
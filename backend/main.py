@@ -1,24 +1,41 @@
-from fastapi import FastAPI, HTTPException, Body, Depends, status, File, UploadFile, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Body, Depends, Query, Request, status, File, UploadFile, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from anyio import to_thread
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import delete, exists, func, literal, or_, select, tuple_, update, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
-import shutil
+import json
+import asyncio
+import base64
+import hashlib
+import threading
 from schemas import (
     Project, ProjectStatus, ProjectStatusUpdate, ProjectEstimateUpdate,
-    JoinRequestAction, PartnerRequest, NGO_PartnerRequest, AppealAction, Draft, Resource, NPO, NPOStatusUpdate,
+    JoinRequestAction, PartnerRequest, NGO_PartnerRequest, AppealAction, Draft, DraftAutosaveResult, Resource, NPO, NPOStatusUpdate,
     Resource, GlobalSettings, User, UserRegister, UserLogin, Token, UserRole,
     Opportunity, ProjectDetails, Template, KnowledgeBaseEntry, UserUpdate, PolygonIntersectionRequest
 )
-from models import DBProject, DBNPO, DBResource, DBGlobalSettings, DBUser, DBOpportunity, DBProjectDetails, DBTemplate, DBKnowledgeBaseEntry
+from models import PROJECT_DETECTED_OBJECTS, DBProject, DBProjectJoinRequest, DBProjectMember, DBProjectPartnerRequest, DBNPO, DBResource, DBUser, DBOpportunity, DBProjectDetails, DBTemplate, DBKnowledgeBaseEntry
 from database import get_db
 import database
+from cache import TTLCache
+from jobs import ClassificationWorker, Debouncer, enqueue_classification
+from storage import IMMUTABLE_CACHE_CONTROL, storage
+from reference import reference_cache
+from uploads import UnsupportedMediaTypeError, UploadError, UploadTooLargeError, presign_upload, save_upload
+from images import IMAGE_VARIANTS, build_all_variants, build_variant, variant_urls
+from notifications import ConnectionManager, NotificationDispatcher, add_notification, create_backplane
 import uuid
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from geoalchemy2.elements import WKTElement
@@ -39,13 +56,19 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 app = FastAPI(title="Городская Инициатива API")
 
-# Создаем папку для загрузок, если её нет
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_DIR = os.path.join(BASE_DIR, "static", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Монтируем статику, чтобы картинки были доступны по ссылке
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+# Монтируем статику, чтобы картинки были доступны по ссылке. Загрузки лежат здесь только
+# при STORAGE_BACKEND=local; с s3 они отдаются из бакета (см. storage.py)
+class CachedStaticFiles(StaticFiles):
+    """Имена загрузок уникальны (uuid или sha256), файлы не перезаписываются — браузер кэширует их навсегда."""
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304) and path.startswith("uploads"):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+app.mount("/static", CachedStaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
 
 # Настройка CORS
 app.add_middleware(
@@ -54,57 +77,157 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Синхронные обработчики (def) и зависимости FastAPI исполняет в пуле потоков AnyIO,
+# поэтому запросы к БД не блокируют event loop. Размер пула согласован с пулом
+# соединений SQLAlchemy, чтобы потоки не простаивали в ожидании соединения.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", str(database.DB_POOL_SIZE + database.DB_MAX_OVERFLOW)))
+
 @app.on_event("startup")
 async def startup_event():
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     # Инициализация БД при старте сервера
-    database.init_db()
+    await run_in_threadpool(database.init_db)
+    await run_in_threadpool(reference_cache.get)
+    await check_idea_client.start()
+    await manager.start()
+    notification_dispatcher.start()
+    classification_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await classification_worker.stop()
+    await notification_dispatcher.stop()
+    await manager.stop()
+    await check_idea_client.close()
+    password_hasher.shutdown()
 
 # --- WebSockets ---
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, user_id: str):
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
-    async def send_personal_message(self, message: dict, user_id: str):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error sending message to {user_id}: {e}")
-
-manager = ConnectionManager()
+manager = ConnectionManager(backplane=create_backplane(database.engine))
+notification_dispatcher = NotificationDispatcher(publish=manager.send_personal_message)
 
 @app.websocket("/api/ws/notifications/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
+async def websocket_endpoint(websocket: WebSocket, user_id: str, since: Optional[int] = None, token: Optional[str] = None):
+    # Браузерный WebSocket не передаёт заголовок Authorization, поэтому JWT приходит в ?token=.
+    # Проверяем до регистрации в manager и чтения outbox: чужой сокет не получит ни истории,
+    # ни возможности вытеснить соединения владельца
+    try:
+        principal = await run_in_threadpool(get_current_user, token or "")
+    except HTTPException:
+        principal = None
+    if principal is None or principal.id != user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    # since — id последнего полученного уведомления; пропущенные после него придут первыми
+    connection = await manager.connect(websocket, user_id, since=since)
+    if connection is None:
+        return
     try:
         while True:
-            data = await websocket.receive_text()
+            # Любое сообщение клиента (в том числе "pong") продлевает соединение
+            await websocket.receive_text()
+            connection.touch()
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, user_id)
 
 # --- Auth Helpers ---
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHasher:
+    """
+    bcrypt в отдельном ограниченном пуле потоков: хеширование (~100–300 мс) не занимает
+    ни event loop, ни общий пул для обработчиков БД. Если очередь переполнена,
+    запрос отклоняется с 503, а не копится бесконечно во время «шторма» логинов.
+    in_flight уменьшается, когда поток bcrypt действительно освободился (колбэк future
+    пула), а не когда ушёл ожидающий запрос: отменённый клиентом запрос продолжает занимать
+    поток, и 503 должен это учитывать. Колбэк идёт в потоке пула, поэтому счётчики под замком.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            overloaded = self.in_flight >= self.workers + self.max_queue
+            if overloaded:
+                self.rejected += 1
+            else:
+                self.in_flight += 1
+        if overloaded:
+            raise HTTPException(
+                status_code=503,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:
+            # Пул уже остановлен (завершение процесса)
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("PASSWORD_HASH_QUEUE", "64")),
+)
+
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+
+def _get_user_by_email(db: Session, email: str) -> Optional[DBUser]:
+    return db.query(DBUser).filter(DBUser.email == email).first()
+
+
+def _save(db: Session, obj):
+    db.add(obj)
+    db.commit()
+    db.refresh(obj)
+    return obj
 
 
 def _build_point_wkt(coordinates: Dict) -> Optional[WKTElement]:
@@ -208,9 +331,141 @@ def _project_row_to_draft(p: DBProject) -> Draft:
         location=p.location,
         coordinates=p.coordinates,
         polygon=p.polygon,
+        version=p.version or 1,
     )
 
 
+
+# --- HTTP caching ---
+
+# no-cache: браузер хранит ответ, но каждый раз сверяет ETag — изменения видны сразу,
+# а неизменённые данные приходят как 304 без тела
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "private, no-cache")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _etag_response(request: Request, content: Any, *, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    JSON-ответ с ETag по хешу тела; на If-None-Match с тем же ETag — 304 без тела.
+    Хеш, а не updated_at: не все пути записи обновляют updated_at, и Last-Modified
+    по нему давал бы ложные 304.
+    """
+    body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": HTTP_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# --- Pagination / projection ---
+
+DEFAULT_PAGE_SIZE = 50
+# Порядок лент проектов (DESC): новые сверху, id разводит одинаковые created_at
+PROJECT_SORT_COLUMNS = [DBProject.created_at, DBProject.id]
+
+
+def _encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str, sort_columns: List[Any]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        if not isinstance(values, list) or len(values) != len(sort_columns):
+            raise ValueError("cursor size mismatch")
+        return [
+            datetime.fromisoformat(v) if isinstance(col.type, DateTime) and v is not None else v
+            for col, v in zip(sort_columns, values)
+        ]
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_fields(model, schema, fields: Optional[str]) -> Optional[List[str]]:
+    """Разбирает fields=a,b,c; допускаются только поля схемы, хранящиеся в колонках модели."""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    allowed = set(schema.model_fields) & set(model.__table__.columns.keys())
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return list(dict.fromkeys(requested))
+
+
+def _keyset_page(query, sort_columns: List[Any], *, descending: bool, after: Optional[List[Any]], page_size: int):
+    """Keyset-страница: строки после курсора after в порядке sort_columns (его же берёт explain_check.py)."""
+    if after is not None:
+        key, values = tuple_(*sort_columns), tuple_(*after)
+        query = query.filter(key < values if descending else key > values)
+    return query.order_by(*[c.desc() if descending else c.asc() for c in sort_columns]).limit(page_size)
+
+
+def _list_response(
+    query,
+    model,
+    schema,
+    response: Response,
+    *,
+    fields: Optional[str],
+    cursor: Optional[str],
+    limit: Optional[int],
+    sort_columns: List[Any],
+    descending: bool = False,
+    request: Optional[Request] = None,
+):
+    """
+    Общий путь для списочных эндпоинтов.
+    Без limit/cursor возвращает весь список (как раньше). С ними — keyset-страницу
+    по sort_columns, а курсор следующей страницы отдаётся в заголовке X-Next-Cursor.
+    С fields= из БД выбираются только запрошенные колонки, и ответ идёт мимо Pydantic.
+    С request ответ сериализуется здесь же и отдаётся с ETag (см. _etag_response).
+    """
+    selected = _parse_fields(model, schema, fields)
+    if selected is not None:
+        sort_keys = [c.key for c in sort_columns]
+        entities = selected + [k for k in sort_keys if k not in selected]
+        query = query.with_entities(*[getattr(model, name) for name in entities])
+
+    page_size = None
+    if limit is not None or cursor is not None:
+        page_size = limit or DEFAULT_PAGE_SIZE
+        after = _decode_cursor(cursor, sort_columns) if cursor else None
+        query = _keyset_page(query, sort_columns, descending=descending, after=after, page_size=page_size)
+
+    rows = query.all()
+
+    next_cursor = None
+    if page_size is not None and len(rows) == page_size:
+        last = rows[-1]
+        next_cursor = _encode_cursor([getattr(last, c.key) for c in sort_columns])
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    if selected is None:
+        if request is not None:
+            items = [schema.model_validate(row, from_attributes=True).model_dump(mode="json") for row in rows]
+            return _etag_response(request, items, headers=headers)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+
+    items = jsonable_encoder([{name: getattr(row, name) for name in selected} for row in rows])
+    if request is not None:
+        return _etag_response(request, items, headers=headers)
+    return JSONResponse(content=items, headers=headers)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -221,7 +476,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Кэш аутентифицированных пользователей по subject токена (email): горячие пути
+# (автосохранение черновика, join, check-idea) не ходят в БД за пользователем.
+# Снимок — схема User без пароля; изменение профиля инвалидирует запись явно.
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60")),
+)
+
+def _user_to_principal(user: DBUser) -> User:
+    return User(
+        id=user.id,
+        email=user.email,
+        role=UserRole(user.role),
+        name=user.name,
+        organization=user.organization,
+        phone=user.phone,
+        address=user.address,
+        bio=user.bio,
+        avatar=user.avatar
+    )
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -234,47 +510,105 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(DBUser).filter(DBUser.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+    with database.SessionLocal() as db:
+        user = _get_user_by_email(db, email)
+        if user is None:
+            raise credentials_exception
+        principal = _user_to_principal(user)
+    principal_cache.set(email, principal)
+    return principal
 
 # --- Utils ---
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
-    # Генерируем уникальное имя файла
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    try:
+        key = await save_upload(file, storage)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedMediaTypeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
     
-    # Сохраняем файл на диск
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Варианты строятся после ответа, чтобы не задерживать загрузку
+    background_tasks.add_task(build_all_variants, key)
     
-    # Возвращаем относительный URL
-    return {"url": f"/static/uploads/{unique_filename}"}
+    url = storage.url(key)
+    return {"url": url, "variants": variant_urls(url)}
+
+class PresignRequest(BaseModel):
+    contentType: str
+    size: int
+    sha256: str
+
+@app.post("/api/upload/presign")
+def presign_upload_endpoint(request: PresignRequest):
+    """
+    Прямая загрузка в хранилище мимо API. direct=false — хранилище её не поддерживает
+    (local), клиент грузит через /api/upload. upload=null — такой файл уже есть.
+    """
+    if not storage.direct_uploads:
+        return {"direct": False}
+    try:
+        result = presign_upload(storage, request.contentType, request.size, request.sha256)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedMediaTypeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"direct": True, **result, "variants": variant_urls(result["url"])}
+
+# Ключи уже построенных вариантов: с s3 не спрашиваем хранилище на каждый запрос
+image_variant_cache = TTLCache(maxsize=10000, ttl=3600)
+
+@app.get("/api/images/{variant}/{key}")
+def get_image_variant(variant: str, key: str):
+    if variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    target = image_variant_cache.get((variant, key))
+    if target is None:
+        if "/" in key or key.startswith(".") or not storage.exists(key):
+            raise HTTPException(status_code=404, detail="Image not found")
+        target = build_variant(variant, key)
+        if target is None:
+            # Pillow недоступен или файл не декодируется — отдаём оригинал, но не кэшируем
+            # ни у себя, ни у клиента: по этому URL позже должен появиться вариант
+            local_path = storage.local_path(key)
+            if local_path is not None:
+                return FileResponse(local_path, headers={"Cache-Control": "no-cache"})
+            return RedirectResponse(storage.url(key), headers={"Cache-Control": "no-cache"})
+        image_variant_cache.set((variant, key), target)
+    local_path = storage.local_path(target)
+    if local_path is not None:
+        return FileResponse(
+            local_path,
+            media_type="image/webp",
+            headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL},
+        )
+    # Сам объект в бакете кэшируется навсегда, а редирект — на сутки
+    return RedirectResponse(storage.url(target), headers={"Cache-Control": "public, max-age=86400"})
 
 # --- Auth Endpoints ---
 
 @app.post("/api/auth/register", response_model=Token)
 async def register(user_in: UserRegister, db: Session = Depends(get_db)):
     email_normalized = user_in.email.lower()
-    user = db.query(DBUser).filter(DBUser.email == email_normalized).first()
+    user = await run_in_threadpool(_get_user_by_email, db, email_normalized)
     if user:
         raise HTTPException(status_code=400, detail="Пользователь с таким Email уже зарегистрирован")
     
     new_user = DBUser(
         id=str(uuid.uuid4()),
         email=email_normalized,
-        password=get_password_hash(user_in.password),
+        password=await get_password_hash(user_in.password),
         role=user_in.role.value,
         name=user_in.name,
         organization=user_in.organization
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await run_in_threadpool(_save, db, new_user)
     
     access_token = create_access_token(data={"sub": new_user.email})
     return {
@@ -292,8 +626,8 @@ async def register(user_in: UserRegister, db: Session = Depends(get_db)):
 @app.post("/api/auth/login", response_model=Token)
 async def login(user_in: UserLogin, db: Session = Depends(get_db)):
     email_normalized = user_in.email.lower()
-    user = db.query(DBUser).filter(DBUser.email == email_normalized).first()
-    if not user or not verify_password(user_in.password, user.password):
+    user = await run_in_threadpool(_get_user_by_email, db, email_normalized)
+    if not user or not await verify_password(user_in.password, user.password):
         raise HTTPException(status_code=401, detail="Неверный email или пароль")
     
     access_token = create_access_token(data={"sub": user.email})
@@ -310,30 +644,24 @@ async def login(user_in: UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.get("/api/auth/me", response_model=User)
-async def read_users_me(current_user: DBUser = Depends(get_current_user)):
-    return User(
-        id=current_user.id,
-        email=current_user.email,
-        role=UserRole(current_user.role),
-        name=current_user.name,
-        organization=current_user.organization,
-        phone=current_user.phone,
-        address=current_user.address,
-        bio=current_user.bio,
-        avatar=current_user.avatar
-    )
+def read_users_me(current_user: User = Depends(get_current_user)):
+    return current_user
 
 @app.patch("/api/users/me", response_model=User)
-async def update_user_me(user_update: UserUpdate, current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_user_me(user_update: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    user = db.query(DBUser).filter(DBUser.id == current_user.id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     for key, value in user_update.dict(exclude_unset=True).items():
-        setattr(current_user, key, value)
+        setattr(user, key, value)
     
     db.commit()
-    db.refresh(current_user)
-    return current_user
+    db.refresh(user)
+    principal_cache.pop(user.email)
+    return user
 
 @app.get("/api/users/{user_id}", response_model=User)
-async def get_user(user_id: str, db: Session = Depends(get_db)):
+def get_user(user_id: str, db: Session = Depends(get_db)):
     user = db.query(DBUser).filter(DBUser.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -351,59 +679,90 @@ async def get_user(user_id: str, db: Session = Depends(get_db)):
 
 # --- AI Check ---
 import httpx
+from check_idea_client import check_idea_client, ServiceUnavailableError
+import ai_service
 
 class CheckIdeaRequest(BaseModel):
     idea: str
 
 @app.post("/api/projects/check-idea")
-async def check_idea(payload: CheckIdeaRequest, current_user: DBUser = Depends(get_current_user)):
+async def check_idea(payload: CheckIdeaRequest, current_user: User = Depends(get_current_user)):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "http://26.217.14.46:8000/api/check-idea",
-                json={"idea": payload.idea},
-                timeout=15.0
-            )
-            response.raise_for_status()
-            return response.json()
+        return await check_idea_client.check_idea_cached(payload.idea, timeout=15.0)
+    except ServiceUnavailableError as exc:
+        raise HTTPException(status_code=503, detail=f"AI service unavailable: {exc}", headers={"Retry-After": "5"})
     except httpx.RequestError as exc:
         raise HTTPException(status_code=503, detail=f"AI service unavailable: {exc}")
     except httpx.HTTPStatusError as exc:
         raise HTTPException(status_code=exc.response.status_code, detail="Error from AI service")
 
+class EstimateRequest(BaseModel):
+    description: str
+
+@app.post("/api/projects/estimate")
+async def estimate_resources(payload: EstimateRequest, current_user: User = Depends(get_current_user)):
+    return await ai_service.estimate_resources_with_ai(payload.description)
+
+@app.post("/api/projects/estimate/stream")
+async def estimate_resources_stream(payload: EstimateRequest, current_user: User = Depends(get_current_user)):
+    """
+    Server-Sent Events: items (позиции после извлечения), price (по мере каждого поиска),
+    estimate (итоговая смета), при ошибке — error.
+    """
+    async def events():
+        try:
+            async for name, data in ai_service.estimate_resources_stream(payload.description):
+                yield f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"Ошибка потоковой сметы: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Не удалось составить смету'}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _classify_idea(description: str) -> Optional[str]:
+    """Категория проекта от check-idea; ошибки сети/статуса пробрасываются для повтора задания."""
+    ai_data = await check_idea_client.check_idea_cached(description)
+    return ai_data.get("category")
+
+classification_worker = ClassificationWorker(classify=_classify_idea, notify=notification_dispatcher.wake)
+
 # --- Drafts (строки в projects со status=DRAFT) ---
 
+def _set_project_type(project_id: str, project_type: str):
+    with database.SessionLocal() as db:
+        project = db.query(DBProject).filter(DBProject.id == project_id).first()
+        if project:
+            project.type = project_type
+            db.commit()
+
+draft_category_debouncer = Debouncer(delay=float(os.getenv("DRAFT_CLASSIFY_DEBOUNCE", "3")))
+
 async def _update_draft_category_bg(draft_id: str, description: str):
-    from database import SessionLocal
     try:
-        async with httpx.AsyncClient() as client:
-            ai_resp = await client.post(
-                "http://26.217.14.46:8000/api/check-idea",
-                json={"idea": description},
-                timeout=10.0
-            )
-            if ai_resp.status_code == 200:
-                ai_data = ai_resp.json()
-                if ai_data.get("category"):
-                    with SessionLocal() as db:
-                        draft = db.query(DBProject).filter(DBProject.id == draft_id).first()
-                        if draft:
-                            draft.type = ai_data["category"]
-                            db.commit()
+        category = await _classify_idea(description)
+        if category:
+            await run_in_threadpool(_set_project_type, draft_id, category)
     except Exception as e:
         print(f"Ошибка фонового обновления категории черновика: {e}")
 
-@app.get("/api/projects/drafts", response_model=List[Draft])
-async def get_drafts(current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
-    rows = (
+def _drafts_query(db: Session, initiator_id: str):
+    """Черновики автора, свежие первыми: частичный индекс ix_projects_drafts_initiator_updated_at."""
+    return (
         db.query(DBProject)
-        .filter(DBProject.initiatorId == current_user.id, DBProject.status == "DRAFT")
-        .all()
+        .filter(DBProject.initiatorId == initiator_id, DBProject.status == "DRAFT")
+        .order_by(DBProject.updated_at.desc())
     )
-    return [_project_row_to_draft(p) for p in rows]
+
+@app.get("/api/projects/drafts", response_model=List[Draft])
+def get_drafts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return [_project_row_to_draft(p) for p in _drafts_query(db, current_user.id).all()]
 
 @app.post("/api/projects/drafts", response_model=Draft)
-async def create_draft(background_tasks: BackgroundTasks, draft_data: Dict = Body(...), current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_draft(background_tasks: BackgroundTasks, draft_data: Dict = Body(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     now = _utcnow()
     polygon = draft_data.get("polygon")
     derived_coords = _derive_coordinates_from_polygon(polygon)
@@ -422,9 +781,6 @@ async def create_draft(background_tasks: BackgroundTasks, draft_data: Dict = Bod
         coordinates=coords,
         status="DRAFT",
         createdAt=now.strftime("%Y-%m-%d"),
-        participants=[],
-        pendingJoinRequests=[],
-        ngoPartnerRequests=[],
         resources=draft_data.get("resources", []),
         type=draft_data.get("type"),
         draft_step=draft_data.get("step", 1),
@@ -443,12 +799,12 @@ async def create_draft(background_tasks: BackgroundTasks, draft_data: Dict = Bod
     
     description = new_draft.description
     if description and len(description) > 10:
-        background_tasks.add_task(_update_draft_category_bg, new_draft.id, description)
+        background_tasks.add_task(draft_category_debouncer.schedule, new_draft.id, _update_draft_category_bg, new_draft.id, description)
         
     return _project_row_to_draft(new_draft)
 
 @app.get("/api/projects/drafts/{draft_id}", response_model=Draft)
-async def get_draft(draft_id: str, current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_draft(draft_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     draft = (
         db.query(DBProject)
         .filter(
@@ -463,7 +819,7 @@ async def get_draft(draft_id: str, current_user: DBUser = Depends(get_current_us
     return _project_row_to_draft(draft)
 
 @app.patch("/api/projects/drafts/{draft_id}", response_model=Draft)
-async def update_draft(draft_id: str, background_tasks: BackgroundTasks, draft_data: Dict = Body(...), current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_draft(draft_id: str, background_tasks: BackgroundTasks, draft_data: Dict = Body(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     draft = (
         db.query(DBProject)
         .filter(
@@ -497,7 +853,7 @@ async def update_draft(draft_id: str, background_tasks: BackgroundTasks, draft_d
     if "coordinates" in payload:
         draft.geom = _build_point_wkt(payload.get("coordinates"))
 
-    skip = {"id", "initiatorId", "lastModified", "status"}
+    skip = {"id", "initiatorId", "lastModified", "status", "version"}
     for key, value in payload.items():
         if key in skip:
             continue
@@ -510,18 +866,96 @@ async def update_draft(draft_id: str, background_tasks: BackgroundTasks, draft_d
         draft.analysis_photos = payload.get("analysisPhotos")
 
     draft.updated_at = _utcnow()
+    draft.version = (draft.version or 0) + 1
     if draft.coordinates:
         draft.geom = _build_point_wkt(draft.coordinates)
     db.commit()
     db.refresh(draft)
     
     if should_check_ai:
-        background_tasks.add_task(_update_draft_category_bg, draft.id, draft.description)
+        background_tasks.add_task(draft_category_debouncer.schedule, draft.id, _update_draft_category_bg, draft.id, draft.description)
         
     return _project_row_to_draft(draft)
 
+# Поля мастера, которые принимает автосохранение -> колонки projects
+_DRAFT_AUTOSAVE_COLUMNS = {
+    "title": "title",
+    "description": "description",
+    "step": "draft_step",
+    "resources": "resources",
+    "type": "type",
+    "budget": "budget",
+    "image": "image",
+    "location": "location",
+    "coordinates": "coordinates",
+    "polygon": "polygon",
+    "projectPhotos": "project_photos",
+    "analysisPhotos": "analysis_photos",
+}
+
+@app.patch("/api/projects/drafts/{draft_id}/autosave", response_model=DraftAutosaveResult)
+def autosave_draft(draft_id: str, background_tasks: BackgroundTasks, draft_data: Dict = Body(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Лёгкое автосохранение мастера. Тело — любое подмножество полей черновика; из БД читаются
+    только эти колонки, а пишутся одним UPDATE ... RETURNING лишь те, что изменились.
+    Геометрия пересчитывается только при смене polygon/coordinates. Если в теле есть
+    version, запись идёт только поверх этой версии, иначе 409 — клиент может слать дельты.
+    """
+    base_version = draft_data.get("version")
+    values = {column: draft_data[key] for key, column in _DRAFT_AUTOSAVE_COLUMNS.items() if key in draft_data}
+    if values.get("polygon"):
+        derived_coords = _derive_coordinates_from_polygon(values["polygon"])
+        if derived_coords:
+            values["coordinates"] = derived_coords
+
+    scope = (DBProject.id == draft_id, DBProject.initiatorId == current_user.id, DBProject.status == "DRAFT")
+    stored = (
+        db.query(DBProject.version, DBProject.updated_at, *[getattr(DBProject, c) for c in values])
+        .filter(*scope)
+        .first()
+    )
+    if not stored:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    if base_version is not None and base_version != stored.version:
+        raise HTTPException(status_code=409, detail="Draft version conflict")
+
+    changed = {column: value for column, value in values.items() if stored._mapping[column] != value}
+    changed_fields = [key for key, column in _DRAFT_AUTOSAVE_COLUMNS.items() if column in changed]
+    if not changed:
+        last_modified = stored.updated_at or _utcnow()
+        return DraftAutosaveResult(id=draft_id, version=stored.version, lastModified=last_modified.isoformat())
+
+    if "polygon" in changed:
+        changed["geom_polygon"] = _build_polygon_wkt(changed["polygon"]) if changed["polygon"] else None
+    if "coordinates" in changed:
+        changed["geom"] = _build_point_wkt(changed["coordinates"])
+    if "project_photos" in changed:
+        changed["photos"] = changed["project_photos"]
+
+    condition = scope if base_version is None else (*scope, DBProject.version == base_version)
+    saved = db.execute(
+        update(DBProject)
+        .where(*condition)
+        .values(**changed, updated_at=_utcnow(), version=DBProject.version + 1)
+        .returning(DBProject.version, DBProject.updated_at)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if not saved:
+        # Между чтением и записью черновик успели изменить или опубликовать
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Draft version conflict")
+    db.commit()
+
+    description = changed.get("description")
+    if description and len(description) > 10:
+        background_tasks.add_task(draft_category_debouncer.schedule, draft_id, _update_draft_category_bg, draft_id, description)
+
+    return DraftAutosaveResult(
+        id=draft_id, version=saved.version, lastModified=saved.updated_at.isoformat(), changed=changed_fields,
+    )
+
 @app.delete("/api/projects/drafts/{draft_id}")
-async def delete_draft(draft_id: str, current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_draft(draft_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     draft = (
         db.query(DBProject)
         .filter(
@@ -539,7 +973,11 @@ async def delete_draft(draft_id: str, current_user: DBUser = Depends(get_current
 # --- Projects ---
 
 @app.post("/api/projects", response_model=Project)
-async def create_project(project_data: Dict = Body(...), current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_project(project_data: Dict = Body(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Категорию уточняет сервис check-idea в фоне (jobs.py); до этого — тип из запроса
+    project_type = project_data.get("type", "Благоустройство")
+    description = project_data.get("description", "")
+
     # Calculate total budget from resources if provided
     resources = project_data.get("resources", [])
     total_budget = project_data.get("budget")
@@ -553,24 +991,6 @@ async def create_project(project_data: Dict = Body(...), current_user: DBUser =
     now = _utcnow()
     draft_id = project_data.get("draftId")
 
-    project_type = project_data.get("type", "Благоустройство")
-    description = project_data.get("description", "")
-    
-    if description:
-        try:
-            async with httpx.AsyncClient() as client:
-                ai_resp = await client.post(
-                    "http://26.217.14.46:8000/api/check-idea",
-                    json={"idea": description},
-                    timeout=10.0
-                )
-                if ai_resp.status_code == 200:
-                    ai_data = ai_resp.json()
-                    if ai_data.get("category"):
-                        project_type = ai_data["category"]
-        except Exception as e:
-            print(f"Ошибка при определении категории проекта через ИИ: {e}")
-
     if draft_id:
         existing = (
             db.query(DBProject)
@@ -609,14 +1029,13 @@ async def create_project(project_data: Dict = Body(...), current_user: DBUser =
             existing.draft_step = None
             existing.updated_at = now
             existing.createdAt = project_data.get("createdAt") or now.strftime("%Y-%m-%d")
-            parts = list(existing.participants or [])
-            if current_user.name and current_user.name not in parts:
-                parts.insert(0, current_user.name)
-            if not parts:
-                parts = [current_user.name]
-            existing.participants = parts
+            if db.get(DBProjectMember, (existing.id, current_user.id)) is None:
+                existing.members.append(DBProjectMember(user_id=current_user.id, created_at=now))
+            if existing.description:
+                enqueue_classification(db, existing.id, existing.description)
             db.commit()
             db.refresh(existing)
+            classification_worker.wake()
             return existing
 
     new_project = DBProject(
@@ -630,9 +1049,7 @@ async def create_project(project_data: Dict = Body(...), current_user: DBUser =
         status=project_data.get("status", "ACTIVE"),
         initiatorId=current_user.id,
         createdAt=now.strftime("%Y-%m-%d"),
-        participants=[current_user.name], # Добавляем инициатора в участники
-        pendingJoinRequests=[],
-        ngoPartnerRequests=[],
+        members=[DBProjectMember(user_id=current_user.id, created_at=now)], # Добавляем инициатора в участники
         resources=resources,
         type=project_type,
         ai_score=project_data.get("ai_score", 100),
@@ -647,13 +1064,16 @@ async def create_project(project_data: Dict = Body(...), current_user: DBUser =
         updated_at=now,
     )
     db.add(new_project)
+    if description:
+        enqueue_classification(db, new_project.id, description)
     db.commit()
     db.refresh(new_project)
+    classification_worker.wake()
     return new_project
 
 
 @app.post("/api/projects/intersections", response_model=List[Project])
-async def find_polygon_intersections(payload: PolygonIntersectionRequest, db: Session = Depends(get_db)):
+def find_polygon_intersections(payload: PolygonIntersectionRequest, db: Session = Depends(get_db)):
     if not payload.coordinates or len(payload.coordinates) < 3:
         return []
         
@@ -673,51 +1093,99 @@ async def find_polygon_intersections(payload: PolygonIntersectionRequest, db: Se
     
     return intersections
 
+def _projects_query(
+    db: Session,
+    *,
+    initiator_id: Optional[str] = None,
+    npo_id: Optional[str] = None,
+    participant_id: Optional[str] = None,
+    resource_category: Optional[str] = None,
+    detected_object: Optional[str] = None,
+):
+    """Фильтры списка опубликованных проектов; планы этих запросов проверяет explain_check.py."""
+    query = db.query(DBProject).filter(DBProject.status != "DRAFT")
+    if initiator_id:
+        query = query.filter(DBProject.initiatorId == initiator_id)
+    if npo_id:
+        query = query.filter(DBProject.npoId == npo_id)
+    if participant_id:
+        # «Проекты, где я участвую» — по индексу ix_project_members_user_id
+        query = query.filter(
+            exists().where(DBProjectMember.project_id == DBProject.id, DBProjectMember.user_id == participant_id)
+        )
+    # JSONB @> по GIN-индексам ix_projects_resources и ix_projects_detected_objects
+    if resource_category:
+        query = query.filter(DBProject.resources.contains([{"category": resource_category}]))
+    if detected_object:
+        query = query.filter(PROJECT_DETECTED_OBJECTS.contains([detected_object]))
+    return query
+
 @app.get("/api/projects", response_model=List[Project])
-async def get_projects(
+def get_projects(
+    response: Response,
     initiator_id: Optional[str] = None, 
     npo_id: Optional[str] = None, 
+    participant_id: Optional[str] = None,
+    resource_category: Optional[str] = None,
+    detected_object: Optional[str] = None,
     lat: Optional[float] = None,
     lng: Optional[float] = None,
     radius: Optional[int] = 500,
+    order: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(DBProject).filter(DBProject.status != "DRAFT")
-    if initiator_id:
-        query = query.filter(DBProject.initiatorId == initiator_id)
-    if npo_id:
-        query = query.filter(DBProject.npoId == npo_id)
-    
-    projects = query.all()
+    query = _projects_query(
+        db,
+        initiator_id=initiator_id,
+        npo_id=npo_id,
+        participant_id=participant_id,
+        resource_category=resource_category,
+        detected_object=detected_object,
+    )
+
+    if order is not None and order != "distance":
+        raise HTTPException(status_code=400, detail="order must be 'distance'")
 
-    # Если переданы координаты, фильтруем по радиусу (Spatial Query Lite)
+    # Фильтрация по радиусу выполняется в PostGIS: ST_DWithin по geography (метры)
+    # использует индекс ix_projects_geom_geography, а сортировка order=distance —
+    # KNN-оператор <-> по GiST-индексу ix_projects_geom.
     if lat is not None and lng is not None:
-        def is_within_radius(proj):
-            if not proj.coordinates: return False
-            # Простейшая формула Гаверсинуса для SQLite
-            from math import sin, cos, sqrt, atan2, radians
-            R = 6371000  # Радиус Земли в метрах
-            p_lat, p_lng = radians(proj.coordinates['lat']), radians(proj.coordinates['lng'])
-            u_lat, u_lng = radians(lat), radians(lng)
-            dlat = u_lat - p_lat
-            dlng = u_lng - p_lng
-            a = sin(dlat / 2)**2 + cos(p_lat) * cos(u_lat) * sin(dlng / 2)**2
-            c = 2 * atan2(sqrt(a), sqrt(1 - a))
-            return R * c <= radius
-
-        projects = [p for p in projects if is_within_radius(p)]
-
-    return projects
+        center = func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326)
+        if radius is not None:
+            query = query.filter(
+                func.ST_DWithin(func.geography(DBProject.geom), func.geography(center), radius)
+            )
+        if order == "distance":
+            query = query.order_by(DBProject.geom.op("<->")(center))
+    elif order == "distance":
+        raise HTTPException(status_code=400, detail="order=distance requires lat and lng")
+
+    if order == "distance":
+        # Ближайшие N: limit — размер выборки, а не keyset-страница
+        if cursor:
+            raise HTTPException(status_code=400, detail="cursor is not supported with order=distance")
+        if limit is not None:
+            query = query.limit(limit)
+        limit = None
+
+    return _list_response(
+        query, DBProject, Project, response,
+        fields=fields, cursor=cursor, limit=limit,
+        sort_columns=PROJECT_SORT_COLUMNS, descending=True,
+    )
 
 @app.get("/api/projects/{project_id}", response_model=Project)
-async def get_project(project_id: str, db: Session = Depends(get_db)):
+def get_project(project_id: str, request: Request, db: Session = Depends(get_db)):
     project = db.query(DBProject).filter(DBProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    return project
+    return _etag_response(request, Project.model_validate(project, from_attributes=True).model_dump(mode="json"))
 
 @app.get("/api/projects/{project_id}/details", response_model=ProjectDetails)
-async def get_project_details(project_id: str, db: Session = Depends(get_db)):
+def get_project_details(project_id: str, db: Session = Depends(get_db)):
     details = db.query(DBProjectDetails).filter(DBProjectDetails.projectId == project_id).first()
     if not details:
         # Create default details if not found
@@ -734,7 +1202,7 @@ async def get_project_details(project_id: str, db: Session = Depends(get_db)):
     return details
 
 @app.patch("/api/projects/{project_id}/status", response_model=Project)
-async def update_project_status(project_id: str, update: ProjectStatusUpdate, db: Session = Depends(get_db)):
+def update_project_status(project_id: str, update: ProjectStatusUpdate, db: Session = Depends(get_db)):
     project = db.query(DBProject).filter(DBProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -744,7 +1212,7 @@ async def update_project_status(project_id: str, update: ProjectStatusUpdate, db
     return project
 
 @app.patch("/api/projects/{project_id}/estimate", response_model=Project)
-async def update_project_estimate(project_id: str, update: ProjectEstimateUpdate, db: Session = Depends(get_db)):
+def update_project_estimate(project_id: str, update: ProjectEstimateUpdate, db: Session = Depends(get_db)):
     project = db.query(DBProject).filter(DBProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -761,64 +1229,86 @@ async def update_project_estimate(project_id: str, update: ProjectEstimateUpdate
     return project
 
 @app.post("/api/projects/{project_id}/join")
-async def join_project(project_id: str, current_user: DBUser = Depends(get_current_user), db: Session = Depends(get_db)):
-    project = db.query(DBProject).filter(DBProject.id == project_id).first()
+def join_project(project_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    project = db.query(DBProject.id, DBProject.title, DBProject.initiatorId).filter(DBProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Добавляем пользователя в список ожидающих
-    pending = list(project.pendingJoinRequests) if project.pendingJoinRequests else []
-    if current_user.name not in pending and current_user.name not in (project.participants or []):
-        pending.append(current_user.name)
-        project.pendingJoinRequests = pending
-        db.commit()
-        
-        import asyncio
-        asyncio.create_task(manager.send_personal_message({
+    # Добавляем пользователя в список ожидающих одной инструкцией: параллельные и повторные
+    # запросы не теряются и не падают на PK, уведомление шлёт только тот, чья строка вставилась
+    inserted = db.execute(
+        pg_insert(DBProjectJoinRequest)
+        .from_select(
+            ["project_id", "user_id", "created_at"],
+            select(
+                literal(project.id), literal(current_user.id), literal(_utcnow(), DateTime(timezone=True))
+            ).where(~exists().where(
+                DBProjectMember.project_id == project.id, DBProjectMember.user_id == current_user.id
+            )),
+        )
+        .on_conflict_do_nothing()
+        .returning(DBProjectJoinRequest.user_id)
+    ).first()
+    if inserted:
+        add_notification(db, project.initiatorId, {
             "type": "new_join_request",
             "project_id": project.id,
             "project_title": project.title,
             "user_name": current_user.name,
             "message": f"Новый запрос на присоединение от {current_user.name}"
-        }, project.initiatorId))
+        })
+        db.commit()
+        notification_dispatcher.wake()
         
     return {"message": "Join request sent"}
 
 @app.post("/api/projects/{project_id}/requests")
-async def handle_join_request(project_id: str, request: JoinRequestAction, db: Session = Depends(get_db)):
+def handle_join_request(project_id: str, request: JoinRequestAction, db: Session = Depends(get_db)):
     project = db.query(DBProject).filter(DBProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    pending = list(project.pendingJoinRequests) if project.pendingJoinRequests else []
-    if request.name in pending:
-        pending.remove(request.name)
-        project.pendingJoinRequests = pending
-        
+    # Клиент присылает имя: ищем его только среди заявок этого проекта (префикс PK project_id).
+    # DELETE ... RETURNING снимает заявку атомарно: из двух параллельных решений по одной
+    # заявке строку получит только одно, второе ничего не изменит и не уведомит повторно
+    target = (
+        select(DBProjectJoinRequest.user_id)
+        .join(DBUser, DBUser.id == DBProjectJoinRequest.user_id)
+        .where(DBProjectJoinRequest.project_id == project.id, DBUser.name == request.name)
+        .order_by(DBProjectJoinRequest.created_at)
+        .limit(1)
+        .scalar_subquery()
+    )
+    user_id = db.execute(
+        delete(DBProjectJoinRequest)
+        .where(DBProjectJoinRequest.project_id == project.id, DBProjectJoinRequest.user_id == target)
+        .returning(DBProjectJoinRequest.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if user_id:
         if request.action == "approve":
-            participants = list(project.participants) if project.participants else []
-            if request.name not in participants:
-                participants.append(request.name)
-                project.participants = participants
+            db.execute(
+                pg_insert(DBProjectMember)
+                .values(project_id=project.id, user_id=user_id, created_at=_utcnow())
+                .on_conflict_do_nothing()
+            )
+        
+        status_text = "одобрен" if request.action == "approve" else "отклонен"
+        add_notification(db, user_id, {
+            "type": "join_request_result",
+            "project_id": project.id,
+            "project_title": project.title,
+            "message": f"Ваш запрос на присоединение к проекту «{project.title}» был {status_text}."
+        })
         
         db.commit()
         db.refresh(project)
-        
-        user = db.query(DBUser).filter(DBUser.name == request.name).first()
-        if user:
-            import asyncio
-            status_text = "одобрен" if request.action == "approve" else "отклонен"
-            asyncio.create_task(manager.send_personal_message({
-                "type": "join_request_result",
-                "project_id": project.id,
-                "project_title": project.title,
-                "message": f"Ваш запрос на присоединение к проекту «{project.title}» был {status_text}."
-            }, user.id))
+        notification_dispatcher.wake()
     
-    return {"message": f"Request {request.action}ed for {request.name}", "project": project}
+    return {"message": f"Request {request.action}ed for {request.name}", "project": Project.model_validate(project, from_attributes=True)}
 
 @app.post("/api/projects/{project_id}/partner")
-async def partner_project(project_id: str, request: PartnerRequest, db: Session = Depends(get_db)):
+def partner_project(project_id: str, request: PartnerRequest, db: Session = Depends(get_db)):
     project = db.query(DBProject).filter(DBProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -829,32 +1319,31 @@ async def partner_project(project_id: str, request: PartnerRequest, db: Session
     
     db.commit()
     db.refresh(project)
-    return {"message": "Partnership accepted", "project": project}
+    return {"message": "Partnership accepted", "project": Project.model_validate(project, from_attributes=True)}
 
 @app.post("/api/projects/{project_id}/partner-request")
-async def send_partner_request(project_id: str, request: NGO_PartnerRequest, db: Session = Depends(get_db)):
-    project = db.query(DBProject).filter(DBProject.id == project_id).first()
-    if not project:
+def send_partner_request(project_id: str, request: NGO_PartnerRequest, db: Session = Depends(get_db)):
+    if not db.query(exists().where(DBProject.id == project_id)).scalar():
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Добавляем запрос в список запросов проекта
-    new_request = {
-        "npoId": request.npoId,
-        "npoName": request.npoName,
-        "message": request.message
-    }
-    
-    current_requests = list(project.ngoPartnerRequests) if project.ngoPartnerRequests else []
-    # Проверяем, нет ли уже такого запроса
-    if not any(r.get("npoId") == request.npoId for r in current_requests):
-        current_requests.append(new_request)
-        project.ngoPartnerRequests = current_requests
-        db.commit()
+    # Повторный запрос от той же НКО гасит уникальный ключ (project_id, npo_id)
+    db.execute(
+        pg_insert(DBProjectPartnerRequest)
+        .values(
+            project_id=project_id,
+            npo_id=request.npoId,
+            npo_name=request.npoName,
+            message=request.message,
+            created_at=_utcnow(),
+        )
+        .on_conflict_do_nothing()
+    )
+    db.commit()
     
     return {"message": "Partnership request sent"}
 
 @app.post("/api/projects/{project_id}/appeal")
-async def handle_appeal(project_id: str, action: AppealAction, db: Session = Depends(get_db)):
+def handle_appeal(project_id: str, action: AppealAction, db: Session = Depends(get_db)):
     project = db.query(DBProject).filter(DBProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -864,16 +1353,26 @@ async def handle_appeal(project_id: str, action: AppealAction, db: Session = Dep
         project.status = "REJECTED"
     db.commit()
     db.refresh(project)
-    return project
+    return Project.model_validate(project, from_attributes=True)
 
 # --- NPOs ---
 
 @app.get("/api/npos", response_model=List[NPO])
-async def get_npos(db: Session = Depends(get_db)):
-    return db.query(DBNPO).all()
+def get_npos(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    return _list_response(
+        db.query(DBNPO), DBNPO, NPO, response,
+        fields=fields, cursor=cursor, limit=limit, sort_columns=[DBNPO.id], request=request,
+    )
 
 @app.patch("/api/npos/{npo_id}/status", response_model=NPO)
-async def update_npo_status(npo_id: str, update: NPOStatusUpdate, db: Session = Depends(get_db)):
+def update_npo_status(npo_id: str, update: NPOStatusUpdate, db: Session = Depends(get_db)):
     npo = db.query(DBNPO).filter(DBNPO.id == npo_id).first()
     if not npo:
         raise HTTPException(status_code=404, detail="NPO not found")
@@ -885,29 +1384,88 @@ async def update_npo_status(npo_id: str, update: NPOStatusUpdate, db: Session =
 # --- Resources ---
 
 @app.get("/api/resources", response_model=List[Resource])
-async def get_resources(db: Session = Depends(get_db)):
-    return db.query(DBResource).all()
+def get_resources(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    if limit is None and cursor is None and not fields:
+        items = [r.model_dump(mode="json") for r in reference_cache.get().resources]
+        return _etag_response(request, items)
+    return _list_response(
+        db.query(DBResource), DBResource, Resource, response,
+        fields=fields, cursor=cursor, limit=limit, sort_columns=[DBResource.id], request=request,
+    )
 
 @app.get("/api/opportunities", response_model=List[Opportunity])
-async def get_opportunities(db: Session = Depends(get_db)):
-    return db.query(DBOpportunity).all()
+def get_opportunities(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    return _list_response(
+        db.query(DBOpportunity), DBOpportunity, Opportunity, response,
+        fields=fields, cursor=cursor, limit=limit, sort_columns=[DBOpportunity.id],
+    )
 
 # --- Admin / AI ---
 
 @app.get("/api/admin/settings", response_model=GlobalSettings)
-async def get_settings(db: Session = Depends(get_db)):
-    settings = db.query(DBGlobalSettings).filter(DBGlobalSettings.id == 1).first()
+def get_settings(request: Request):
+    settings = reference_cache.get().settings
     if not settings:
         raise HTTPException(status_code=404, detail="Settings not found")
-    return settings
+    return _etag_response(request, settings.model_dump(mode="json"))
 
 @app.get("/api/admin/templates", response_model=List[Template])
-async def get_templates(db: Session = Depends(get_db)):
-    return db.query(DBTemplate).all()
+def get_templates(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    if limit is None and cursor is None and not fields:
+        items = [t.model_dump(mode="json") for t in reference_cache.get().templates]
+        return _etag_response(request, items)
+    return _list_response(
+        db.query(DBTemplate), DBTemplate, Template, response,
+        fields=fields, cursor=cursor, limit=limit, sort_columns=[DBTemplate.id], request=request,
+    )
 
 @app.get("/api/admin/knowledge-base", response_model=List[KnowledgeBaseEntry])
-async def get_knowledge_base(db: Session = Depends(get_db)):
-    return db.query(DBKnowledgeBaseEntry).all()
+def get_knowledge_base(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    if limit is None and cursor is None and not fields:
+        items = [e.model_dump(mode="json") for e in reference_cache.get().knowledge_base]
+        return _etag_response(request, items)
+    return _list_response(
+        db.query(DBKnowledgeBaseEntry), DBKnowledgeBaseEntry, KnowledgeBaseEntry, response,
+        fields=fields, cursor=cursor, limit=limit, sort_columns=[DBKnowledgeBaseEntry.id], request=request,
+    )
+
+@app.get("/api/admin/metrics")
+def get_metrics():
+    return {
+        "password_hashing": password_hasher.stats(),
+        "principal_cache": principal_cache.stats(),
+        "check_idea": check_idea_client.stats(),
+        "ai_service": ai_service.cache_stats(),
+        "reference_cache": reference_cache.stats(),
+        "notifications": {**manager.stats(), "dispatched": notification_dispatcher.dispatched},
+    }
 
 @app.post("/api/ai/models/{model_id}/retrain")
 async def retrain_model(model_id: str):
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, String, Float, Integer, Enum, JSON, ForeignKey, DateTime
+from sqlalchemy import BigInteger, Column, String, Float, Integer, Enum, JSON, ForeignKey, DateTime, Index, func, literal_column
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 import enum
 
@@ -49,33 +51,161 @@ class DBProject(Base):
     budget = Column(Float)
     image = Column(String)
     location = Column(String)
-    coordinates = Column(JSON) # {lat: float, lng: float}
+    coordinates = Column(JSONB) # {lat: float, lng: float}
     status = Column(String)
     initiatorId = Column(String, ForeignKey("users.id"), nullable=False, index=True)
     npoId = Column(String, nullable=True)
     createdAt = Column(String)
-    participants = Column(JSON, default=[])
-    pendingJoinRequests = Column(JSON, default=[])
-    ngoPartnerRequests = Column(JSON, default=[])
-    resources = Column(JSON, default=[])
+    resources = Column(JSONB, default=[])
     type = Column(String, nullable=True) # Тип проекта (Благоустройство, Дороги и т.д.)
 
     # Новые поля по ТЗ:
     ai_score = Column(Float, default=0)
     rejection_reason = Column(String, nullable=True)
-    image_analysis = Column(JSON, nullable=True) # { quality_score: float, detected_objects: string[] }
+    image_analysis = Column(JSONB, nullable=True) # { quality_score: float, detected_objects: string[] }
     search_radius = Column(Integer, default=500)
     geom = Column(Geometry(geometry_type="POINT", srid=4326), nullable=True)
     geom_polygon = Column(Geometry(geometry_type="POLYGON", srid=4326), nullable=True)
 
     # Черновик / мастер заявки
     draft_step = Column(Integer, nullable=True)
-    photos = Column(JSON, nullable=True)  # legacy field, используем project_photos
-    project_photos = Column(JSON, nullable=True)
-    analysis_photos = Column(JSON, nullable=True)
-    polygon = Column(JSON, nullable=True)  # кольцо [lng,lat][] до публикации; дублирует смысл geom_polygon после
-    created_at = Column(DateTime(timezone=True), nullable=True)
+    photos = Column(JSONB, nullable=True)  # legacy field, используем project_photos
+    project_photos = Column(JSONB, nullable=True)
+    analysis_photos = Column(JSONB, nullable=True)
+    polygon = Column(JSONB, nullable=True)  # кольцо [lng,lat][] до публикации; дублирует смысл geom_polygon после
+    # NOT NULL: по (created_at, id) идёт keyset-пагинация, NULL ломал бы курсор
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), nullable=True)
+    # Счётчик правок черновика для оптимистичной блокировки автосохранения
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Участники и заявки — отдельные таблицы по id пользователя; в API по-прежнему отдаются
+    # списками имён (свойства ниже), selectin грузит их одним запросом на всю страницу проектов
+    members = relationship(
+        "DBProjectMember", order_by="DBProjectMember.created_at", lazy="selectin",
+        cascade="all, delete-orphan", passive_deletes=True,
+    )
+    join_requests = relationship(
+        "DBProjectJoinRequest", order_by="DBProjectJoinRequest.created_at", lazy="selectin",
+        cascade="all, delete-orphan", passive_deletes=True,
+    )
+    partner_requests = relationship(
+        "DBProjectPartnerRequest", order_by="DBProjectPartnerRequest.created_at", lazy="selectin",
+        cascade="all, delete-orphan", passive_deletes=True,
+    )
+
+    @property
+    def participants(self):
+        return [m.user.name for m in self.members]
+
+    @property
+    def pendingJoinRequests(self):
+        return [r.user.name for r in self.join_requests]
+
+    @property
+    def ngoPartnerRequests(self):
+        return [{"npoId": r.npo_id, "npoName": r.npo_name, "message": r.message} for r in self.partner_requests]
+
+# ST_DWithin по geography (радиус в метрах) использует этот индекс, а не ix_projects_geom
+Index("ix_projects_geom_geography", func.geography(DBProject.geom), postgresql_using="gist")
+# keyset-пагинация списков проектов: ORDER BY created_at DESC, id DESC
+Index("ix_projects_created_at_id", DBProject.created_at, DBProject.id)
+# То же для опубликованных (status != 'DRAFT'): страница не пробегает по строкам черновиков
+Index(
+    "ix_projects_published_created_at_id",
+    DBProject.created_at,
+    DBProject.id,
+    postgresql_where=DBProject.status != "DRAFT",
+)
+# Опубликованные проекты автора (initiator_id=) той же keyset-лентой
+Index(
+    "ix_projects_published_initiator_created_at_id",
+    DBProject.initiatorId,
+    DBProject.created_at,
+    DBProject.id,
+    postgresql_where=DBProject.status != "DRAFT",
+)
+# Черновики автора: WHERE "initiatorId" = ? AND status = 'DRAFT' ORDER BY updated_at DESC
+Index(
+    "ix_projects_drafts_initiator_updated_at",
+    DBProject.initiatorId,
+    DBProject.updated_at,
+    postgresql_where=DBProject.status == "DRAFT",
+)
+# Проекты НКО: npoId = ? с фильтром по статусу
+Index("ix_projects_npo_id_status", DBProject.npoId, DBProject.status)
+# Фильтр resource_category: resources @> '[{"category": ...}]'
+Index("ix_projects_resources", DBProject.resources, postgresql_using="gin", postgresql_ops={"resources": "jsonb_path_ops"})
+# Фильтр detected_object: (image_analysis -> 'detected_objects') @> '["..."]'. Запрос должен
+# строиться из этого же выражения, иначе планировщик не сопоставит его с индексом
+PROJECT_DETECTED_OBJECTS = DBProject.image_analysis.op("->", return_type=JSONB)(literal_column("'detected_objects'"))
+Index("ix_projects_detected_objects", PROJECT_DETECTED_OBJECTS, postgresql_using="gin")
+
+class DBProjectMember(Base):
+    """Участник проекта. PK (project_id, user_id); «мои проекты» — по ix_project_members_user_id."""
+    __tablename__ = "project_members"
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    user = relationship("DBUser", lazy="joined", innerjoin=True)
+
+class DBProjectJoinRequest(Base):
+    """Заявка пользователя на участие в проекте, ожидающая решения инициатора."""
+    __tablename__ = "project_join_requests"
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    user = relationship("DBUser", lazy="joined", innerjoin=True)
+
+class DBProjectPartnerRequest(Base):
+    """Предложение партнёрства от НКО."""
+    __tablename__ = "project_partner_requests"
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    npo_id = Column(String, primary_key=True, index=True)
+    npo_name = Column(String, nullable=False)
+    message = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+class DBClassificationJob(Base):
+    """Отложенная классификация категории проекта через check-idea (см. jobs.py)."""
+    __tablename__ = "classification_jobs"
+    id = Column(String, primary_key=True)
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    description = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending") # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+Index("ix_classification_jobs_status_next_attempt", DBClassificationJob.status, DBClassificationJob.next_attempt_at)
+
+class DBNotification(Base):
+    """Outbox уведомлений (см. notifications.py); id служит курсором since= при переподключении."""
+    __tablename__ = "notifications"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    dispatched_at = Column(DateTime(timezone=True), nullable=True)
+
+# Догрузка пропущенных: WHERE user_id = ? AND id > ? ORDER BY id
+Index("ix_notifications_user_id_id", DBNotification.user_id, DBNotification.id)
+# Диспетчер выбирает только ещё не разосланные
+Index(
+    "ix_notifications_undispatched",
+    DBNotification.id,
+    postgresql_where=DBNotification.dispatched_at.is_(None),
+)
+
+class DBAICache(Base):
+    """Кэш по sha256 нормализованного текста (см. cache.py): сметы (estimate), цены по позиции (price), ответы check-idea (check_idea)."""
+    __tablename__ = "ai_cache"
+    namespace = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    value = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
 
 class DBNPO(Base):
     __tablename__ = "npos"
@@ -145,3 +275,10 @@ class DBGlobalSettings(Base):
     minBudget = Column(Float)
     defaultSubsidyRate = Column(Float)
     currentYear = Column(Integer)
+
+class DBReferenceVersion(Base):
+    """Штамп версии справочных таблиц (см. reference.py): меняется при каждой их записи."""
+    __tablename__ = "reference_versions"
+    name = Column(String, primary_key=True)
+    version = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
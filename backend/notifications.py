@@ -0,0 +1,655 @@
+"""
+Уведомления пользователей через WebSocket.
+
+ConnectionManager держит сокеты только своего процесса, поэтому сообщения идут через
+бэкплейн: каждый воркер подписан на общий канал и доставляет сообщение тем сокетам
+получателя, которые открыты у него. Бэкплейн выбирается через NOTIFICATIONS_BACKEND:
+  memory   — один процесс (по умолчанию);
+  postgres — LISTEN/NOTIFY в той же базе, без дополнительной инфраструктуры;
+  redis    — Redis pub/sub (REDIS_URL, нужен пакет redis).
+
+Сами уведомления сначала пишутся в таблицу notifications (outbox) в той же транзакции,
+что и изменение состояния, и рассылаются NotificationDispatcher. Если получатель был
+офлайн, при переподключении с ?since=<id последнего полученного> он получает пропущенное.
+
+id берётся из последовательности при вставке, а видна строка становится при коммите, поэтому
+транзакция с меньшим id может закоммититься позже строки с большим id, которую клиент уже
+получил. Чтобы такая строка не пропала при догрузке, since= захватывает ещё и строки,
+созданные за NOTIFICATIONS_REPLAY_LOOKBACK секунд до уведомления since (клиент отбрасывает
+повторы по id). Пропуск остаётся возможен только для транзакций дольше этого окна.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+import database
+from models import DBNotification
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+NOTIFICATIONS_BACKEND = os.getenv("NOTIFICATIONS_BACKEND", "memory")
+NOTIFICATIONS_CHANNEL = os.getenv("NOTIFICATIONS_CHANNEL", "notifications")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Сколько сообщений может ждать отправки на одном сокете, прежде чем старые начнут выбрасываться
+NOTIFICATIONS_QUEUE_SIZE = int(os.getenv("NOTIFICATIONS_QUEUE_SIZE", "100"))
+NOTIFICATIONS_SEND_TIMEOUT = float(os.getenv("NOTIFICATIONS_SEND_TIMEOUT", "5"))
+# Пинг раз в HEARTBEAT_INTERVAL; сокет, от которого ничего не приходило IDLE_TIMEOUT секунд, закрывается
+NOTIFICATIONS_HEARTBEAT_INTERVAL = float(os.getenv("NOTIFICATIONS_HEARTBEAT_INTERVAL", "25"))
+NOTIFICATIONS_IDLE_TIMEOUT = float(os.getenv("NOTIFICATIONS_IDLE_TIMEOUT", "75"))
+NOTIFICATIONS_MAX_PER_USER = int(os.getenv("NOTIFICATIONS_MAX_PER_USER", "5"))
+NOTIFICATIONS_MAX_CONNECTIONS = int(os.getenv("NOTIFICATIONS_MAX_CONNECTIONS", "10000"))
+NOTIFICATIONS_REPLAY_LIMIT = int(os.getenv("NOTIFICATIONS_REPLAY_LIMIT", "500"))
+NOTIFICATIONS_REPLAY_LOOKBACK = float(os.getenv("NOTIFICATIONS_REPLAY_LOOKBACK", "60"))
+NOTIFICATIONS_POLL_INTERVAL = float(os.getenv("NOTIFICATIONS_POLL_INTERVAL", "5"))
+NOTIFICATIONS_BATCH_SIZE = int(os.getenv("NOTIFICATIONS_BATCH_SIZE", "100"))
+NOTIFICATIONS_RETENTION_DAYS = float(os.getenv("NOTIFICATIONS_RETENTION_DAYS", "30"))
+# Пауза перед повторным LISTEN после обрыва соединения: удваивается до RECONNECT_MAX
+NOTIFICATIONS_RECONNECT_MIN = float(os.getenv("NOTIFICATIONS_RECONNECT_MIN", "0.5"))
+NOTIFICATIONS_RECONNECT_MAX = float(os.getenv("NOTIFICATIONS_RECONNECT_MAX", "30"))
+
+Deliver = Callable[[str, dict], Awaitable[None]]
+Publisher = Callable[[dict, str], Awaitable[None]]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- Outbox ---
+
+def add_notification(db: Session, user_id: str, message: dict) -> DBNotification:
+    """Добавляет уведомление в сессию; коммит — вместе с изменением, о котором оно сообщает."""
+    notification = DBNotification(user_id=user_id, payload=message, created_at=_utcnow())
+    db.add(notification)
+    return notification
+
+
+def _to_message(notification: DBNotification) -> dict:
+    return {
+        **notification.payload,
+        "id": notification.id,
+        "created_at": notification.created_at.isoformat(),
+    }
+
+
+def load_notifications_since(
+    user_id: str,
+    since: int,
+    limit: int = NOTIFICATIONS_REPLAY_LIMIT,
+    lookback: float = NOTIFICATIONS_REPLAY_LOOKBACK,
+) -> List[dict]:
+    """Уведомления после since плюс закоммиченные позже строки из окна lookback (см. модуль)."""
+    with database.SessionLocal() as db:
+        condition = DBNotification.id > since
+        anchor = (
+            db.query(DBNotification.created_at)
+            .filter(DBNotification.user_id == user_id, DBNotification.id == since)
+            .scalar()
+        )
+        if anchor is not None and lookback > 0:
+            condition = or_(condition, DBNotification.created_at >= anchor - timedelta(seconds=lookback))
+        rows = (
+            db.query(DBNotification)
+            .filter(DBNotification.user_id == user_id, condition)
+            .order_by(DBNotification.id)
+            .limit(limit)
+            .all()
+        )
+        return [_to_message(row) for row in rows]
+
+
+def _lock_undispatched(limit: int) -> Tuple[Session, List[Tuple[int, str, dict]]]:
+    """
+    Блокирует пачку неразосланных строк (FOR UPDATE SKIP LOCKED) и оставляет транзакцию
+    открытой до _mark_dispatched: другие воркеры эти строки пропустят, а при падении
+    процесса блокировка снимется и строки останутся неразосланными.
+    """
+    db = database.SessionLocal()
+    try:
+        rows = (
+            db.query(DBNotification)
+            .filter(DBNotification.dispatched_at.is_(None))
+            .order_by(DBNotification.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        return db, [(row.id, row.user_id, _to_message(row)) for row in rows]
+    except Exception:
+        db.close()
+        raise
+
+
+def _mark_dispatched(db: Session, ids: List[int]):
+    """Отмечает опубликованные строки и снимает блокировку; остальные уйдут в следующий проход."""
+    try:
+        if ids:
+            (
+                db.query(DBNotification)
+                .filter(DBNotification.id.in_(ids))
+                .update({DBNotification.dispatched_at: _utcnow()}, synchronize_session=False)
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _purge_expired(retention_days: float) -> int:
+    with database.SessionLocal() as db:
+        deleted = (
+            db.query(DBNotification)
+            .filter(DBNotification.created_at < _utcnow() - timedelta(days=retention_days))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+
+
+class NotificationDispatcher:
+    """
+    Рассылает записи outbox через ConnectionManager. Строки забираются через
+    FOR UPDATE SKIP LOCKED, поэтому при нескольких воркерах их не публикуют параллельно;
+    dispatched_at ставится только после успешной публикации, неудачные повторяются в
+    следующем проходе (доставка «хотя бы один раз», клиент отбрасывает повторы по id).
+    Гарантию доставки офлайн-получателю даёт догрузка по since=.
+    """
+
+    def __init__(self, publish: Publisher):
+        self._publish = publish
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._purged_at = 0.0
+        self.dispatched = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Будит диспетчер после коммита уведомления; можно вызывать из пула потоков."""
+        if self._loop and self._wake:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while True:
+            # Сбрасываем до выборки: wake() во время рассылки пачки не потеряется
+            self._wake.clear()
+            try:
+                db, batch = await run_in_threadpool(_lock_undispatched, NOTIFICATIONS_BATCH_SIZE)
+                published: List[int] = []
+                try:
+                    for notification_id, user_id, message in batch:
+                        try:
+                            await self._publish(message, user_id)
+                            published.append(notification_id)
+                            self.dispatched += 1
+                        except Exception as e:
+                            print(f"Ошибка публикации уведомления {notification_id}: {e}")
+                finally:
+                    await run_in_threadpool(_mark_dispatched, db, published)
+                # После ошибок публикации не крутимся вхолостую, а ждём обычного интервала
+                if len(batch) == NOTIFICATIONS_BATCH_SIZE and len(published) == len(batch):
+                    continue
+                if self._loop.time() - self._purged_at > 3600:
+                    self._purged_at = self._loop.time()
+                    await run_in_threadpool(_purge_expired, NOTIFICATIONS_RETENTION_DAYS)
+            except Exception as e:
+                print(f"Ошибка диспетчера уведомлений: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=NOTIFICATIONS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+# --- Бэкплейны ---
+
+
+def _encode(user_id: str, message: dict) -> str:
+    return json.dumps({"user_id": user_id, "message": message}, ensure_ascii=False)
+
+
+def _decode(payload) -> Optional[tuple]:
+    try:
+        data = json.loads(payload)
+        return data["user_id"], data["message"]
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Некорректное сообщение в канале уведомлений: {e}")
+        return None
+
+
+class InMemoryBackplane:
+    """Доставка внутри процесса; подходит для одного воркера uvicorn."""
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def publish(self, user_id: str, message: dict):
+        await self._deliver(user_id, message)
+
+
+class PostgresBackplane:
+    """
+    LISTEN/NOTIFY. Слушатель — отдельное psycopg2-соединение в autocommit, чьё
+    событие готовности сокета обрабатывается прямо в event loop (add_reader).
+    Публикация — pg_notify через общий пул движка. При обрыве соединения слушатель
+    переподключается с растущей паузой и заново выполняет LISTEN; NOTIFY за время
+    обрыва теряются, клиенты добирают их из outbox через ?since=.
+    """
+
+    def __init__(self, engine, channel: str = NOTIFICATIONS_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: set = set()
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+        self._attach(await run_in_threadpool(self._listen))
+
+    def _listen(self):
+        # Отдельное соединение вне пула: оно всё время занято LISTEN
+        cargs, cparams = self.engine.dialect.create_connect_args(self.engine.url)
+        conn = self.engine.dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def _attach(self, conn):
+        self._conn = conn
+        self._loop.add_reader(conn.fileno(), self._on_readable)
+
+    def _detach(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            self._loop.remove_reader(conn.fileno())
+        except (ValueError, OSError):
+            # Сокет уже закрыт — fileno() недоступен, читатель снят вместе с ним
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _on_readable(self):
+        try:
+            self._conn.poll()
+        except Exception as e:
+            print(f"Ошибка соединения LISTEN: {e}, переподключение")
+            self._detach()
+            if self._reconnect_task is None:
+                self._reconnect_task = self._loop.create_task(self._reconnect())
+            return
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            decoded = _decode(notify.payload)
+            if decoded:
+                task = self._loop.create_task(self._deliver(*decoded))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _reconnect(self):
+        delay = NOTIFICATIONS_RECONNECT_MIN
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    conn = await run_in_threadpool(self._listen)
+                except Exception as e:
+                    delay = min(delay * 2, NOTIFICATIONS_RECONNECT_MAX)
+                    print(f"Не удалось восстановить LISTEN: {e}, повтор через {delay:.1f} с")
+                    continue
+                self._attach(conn)
+                self.reconnects += 1
+                return
+        finally:
+            self._reconnect_task = None
+
+    async def stop(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            try:
+                await self._reconnect_task
+            except asyncio.CancelledError:
+                pass
+        self._detach()
+
+    def _notify(self, payload: str):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+            conn.commit()
+
+    async def publish(self, user_id: str, message: dict):
+        await run_in_threadpool(self._notify, _encode(user_id, message))
+
+
+class RedisBackplane:
+    """
+    Redis pub/sub. При обрыве подписки (ConnectionError, рестарт Redis) читатель
+    переподписывается с растущей паузой, как PostgresBackplane; сообщения за время
+    обрыва клиенты добирают из outbox через ?since=.
+    """
+
+    def __init__(self, url: str = REDIS_URL, channel: str = NOTIFICATIONS_CHANNEL):
+        if aioredis is None:
+            raise RuntimeError("NOTIFICATIONS_BACKEND=redis требует пакет redis")
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._redis = aioredis.from_url(self.url)
+        await self._subscribe()
+        self._task = asyncio.create_task(self._reader())
+
+    async def _subscribe(self):
+        pubsub = self._redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+        except Exception:
+            await pubsub.close()
+            raise
+        self._pubsub = pubsub
+
+    async def _close_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    async def _reader(self):
+        delay = NOTIFICATIONS_RECONNECT_MIN
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    self.reconnects += 1
+                    print(f"Подписка Redis на {self.channel} восстановлена")
+                async for item in self._pubsub.listen():
+                    delay = NOTIFICATIONS_RECONNECT_MIN
+                    if item.get("type") != "message":
+                        continue
+                    decoded = _decode(item["data"])
+                    if decoded:
+                        try:
+                            await self._deliver(*decoded)
+                        except Exception as e:
+                            print(f"Ошибка доставки уведомления: {e}")
+                raise ConnectionError("поток подписки завершился")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка подписки Redis: {e}, переподключение через {delay:.1f} с")
+                await self._close_pubsub()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, NOTIFICATIONS_RECONNECT_MAX)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._close_pubsub()
+        if self._redis is not None:
+            await self._redis.close()
+
+    async def publish(self, user_id: str, message: dict):
+        await self._redis.publish(self.channel, _encode(user_id, message))
+
+
+def create_backplane(engine):
+    if NOTIFICATIONS_BACKEND == "postgres":
+        return PostgresBackplane(engine)
+    if NOTIFICATIONS_BACKEND == "redis":
+        return RedisBackplane()
+    return InMemoryBackplane()
+
+
+class _Connection:
+    """
+    Сокет с собственной очередью исходящих сообщений и задачей-отправителем.
+    Медленный клиент копит только свою очередь и не задерживает остальных.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.manager = manager
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=manager.queue_size)
+        self.dropped = 0
+        self.last_seen = asyncio.get_running_loop().time()
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self):
+        """Клиент что-то прислал (в том числе ответ на пинг) — соединение живо."""
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def start(self, backlog: List[dict]):
+        self._task = asyncio.create_task(self._sender(backlog))
+
+    def enqueue(self, message: dict):
+        if self.queue.full():
+            # Клиент не успевает читать: выбрасываем самое старое сообщение
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.manager.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def _sender(self, backlog: List[dict]):
+        # Пока догружался backlog, в очередь могли попасть те же уведомления — их пропускаем
+        replayed_up_to = backlog[-1]["id"] if backlog else 0
+        for message in backlog:
+            if not await self._send(message):
+                return
+        while True:
+            message = await self.queue.get()
+            if message.get("id", replayed_up_to + 1) <= replayed_up_to:
+                continue
+            if not await self._send(message):
+                return
+
+    async def _send(self, message: dict) -> bool:
+        try:
+            await asyncio.wait_for(self.websocket.send_json(message), timeout=self.manager.send_timeout)
+            return True
+        except Exception as e:
+            print(f"Error sending message to {self.user_id}: {e!r}, connection closed")
+            self.manager._evict(self)
+            self.manager.pruned += 1
+            return False
+
+    def cancel(self):
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        backplane=None,
+        queue_size: int = NOTIFICATIONS_QUEUE_SIZE,
+        send_timeout: float = NOTIFICATIONS_SEND_TIMEOUT,
+        heartbeat_interval: float = NOTIFICATIONS_HEARTBEAT_INTERVAL,
+        idle_timeout: float = NOTIFICATIONS_IDLE_TIMEOUT,
+        max_per_user: int = NOTIFICATIONS_MAX_PER_USER,
+        max_connections: int = NOTIFICATIONS_MAX_CONNECTIONS,
+    ):
+        self.active_connections: Dict[str, List[_Connection]] = {}
+        self.backplane = backplane or InMemoryBackplane()
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.max_per_user = max_per_user
+        self.max_connections = max_connections
+        self.connection_count = 0
+        self.peak_connections = 0
+        self.dropped = 0
+        self.pruned = 0
+        self.evicted_idle = 0
+        self.evicted_over_limit = 0
+        self.rejected = 0
+        self._closing: set = set()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.backplane.start(self._deliver_local)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        await self.backplane.stop()
+        for connections in list(self.active_connections.values()):
+            for connection in connections:
+                connection.cancel()
+        self.active_connections.clear()
+        self.connection_count = 0
+
+    async def _heartbeat(self):
+        """Пингует живые сокеты и закрывает те, от которых давно ничего не приходило (half-open)."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = asyncio.get_running_loop().time()
+            for connections in list(self.active_connections.values()):
+                for connection in list(connections):
+                    if now - connection.last_seen > self.idle_timeout:
+                        self._evict(connection, code=1001)
+                        self.evicted_idle += 1
+                    elif connection.queue.empty():
+                        # Непустая очередь и так проверяется таймаутом отправки
+                        connection.enqueue({"type": "ping"})
+
+    async def connect(self, websocket: WebSocket, user_id: str, since: Optional[int] = None) -> Optional[_Connection]:
+        """
+        Регистрирует сокет. С since= сначала отправляет пропущенное из outbox (id > since и окно lookback);
+        пришедшие тем временем живые сообщения ждут в очереди и не дублируются.
+        Возвращает None, если достигнут общий лимит соединений процесса.
+        """
+        if self.connection_count >= self.max_connections:
+            self.rejected += 1
+            await websocket.close(code=1013)  # try again later
+            return None
+        await websocket.accept()
+        connection = _Connection(websocket, user_id, self)
+        connections = self.active_connections.setdefault(user_id, [])
+        while len(connections) >= self.max_per_user:
+            # Новая вкладка вытесняет самое старое соединение пользователя
+            self._evict(connections[0], code=1008)
+            self.evicted_over_limit += 1
+            connections = self.active_connections.setdefault(user_id, [])
+        connections.append(connection)
+        self.connection_count += 1
+        self.peak_connections = max(self.peak_connections, self.connection_count)
+        backlog: List[dict] = []
+        if since is not None:
+            try:
+                backlog = await run_in_threadpool(load_notifications_since, user_id, since)
+            except Exception as e:
+                print(f"Не удалось загрузить пропущенные уведомления для {user_id}: {e}")
+        if connection in self.active_connections.get(user_id, []):
+            connection.start(backlog)
+        return connection
+
+    def disconnect(self, websocket: WebSocket, user_id: str):
+        for connection in self.active_connections.get(user_id, []):
+            if connection.websocket is websocket:
+                self._remove(connection)
+                return
+
+    def _remove(self, connection: _Connection) -> bool:
+        connections = self.active_connections.get(connection.user_id)
+        if not connections or connection not in connections:
+            return False
+        connections.remove(connection)
+        if not connections:
+            del self.active_connections[connection.user_id]
+        self.connection_count -= 1
+        connection.cancel()
+        return True
+
+    def _evict(self, connection: _Connection, code: int = 1011):
+        """Убирает сокет из менеджера и закрывает его в фоне."""
+        if self._remove(connection):
+            task = asyncio.create_task(self._close(connection.websocket, code))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=1.0)
+        except Exception:
+            pass
+
+    async def send_personal_message(self, message: dict, user_id: str):
+        """Публикует сообщение в бэкплейн; доставит тот воркер, у которого открыт сокет."""
+        await self.backplane.publish(user_id, message)
+
+    async def _deliver_local(self, user_id: str, message: dict):
+        # Не ждём отправки: сообщение кладётся в очередь каждого сокета получателя
+        for connection in self.active_connections.get(user_id, []):
+            connection.enqueue(message)
+
+    def stats(self) -> Dict[str, Any]:
+        # Вызывается из пула потоков, поэтому работаем с копией
+        connections = [c for group in list(self.active_connections.values()) for c in list(group)]
+        depths = [c.queue.qsize() for c in connections]
+        return {
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "peak_connections": self.peak_connections,
+            "max_connections": self.max_connections,
+            "max_per_user": self.max_per_user,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "dropped": self.dropped,
+            "pruned": self.pruned,
+            "evicted_idle": self.evicted_idle,
+            "evicted_over_limit": self.evicted_over_limit,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,102 @@
+"""
+Кэш справочных данных: глобальные настройки, шаблоны, база знаний и ресурсы сметы.
+
+Таблицы почти не меняются, поэтому процесс держит их снимок в памяти и отдаёт без
+запросов к БД. Любая запись в справочники должна в той же транзакции вызвать
+mark_changed(db): она меняет штамп версии в reference_versions. Каждый воркер не чаще
+раза в REFERENCE_CHECK_INTERVAL секунд сверяет штамп (один SELECT по первичному ключу)
+и перечитывает снимок, если он изменился.
+"""
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import database
+from models import DBGlobalSettings, DBKnowledgeBaseEntry, DBReferenceVersion, DBResource, DBTemplate
+from schemas import GlobalSettings, KnowledgeBaseEntry, Resource, Template
+
+REFERENCE_CHECK_INTERVAL = float(os.getenv("REFERENCE_CHECK_INTERVAL", "5"))
+VERSION_KEY = "reference"
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    version: Optional[str]
+    settings: Optional[GlobalSettings]
+    templates: List[Template] = field(default_factory=list)
+    knowledge_base: List[KnowledgeBaseEntry] = field(default_factory=list)
+    resources: List[Resource] = field(default_factory=list)
+
+
+def mark_changed(db: Session):
+    """Новый штамп версии; коммит — вместе с изменением справочника."""
+    db.merge(DBReferenceVersion(name=VERSION_KEY, version=uuid.uuid4().hex, updated_at=datetime.now(timezone.utc)))
+
+
+def _read_version(db: Session) -> Optional[str]:
+    row = db.query(DBReferenceVersion.version).filter(DBReferenceVersion.name == VERSION_KEY).first()
+    return row[0] if row else None
+
+
+def _load(db: Session) -> ReferenceData:
+    version = _read_version(db)
+    settings = db.query(DBGlobalSettings).filter(DBGlobalSettings.id == 1).first()
+    return ReferenceData(
+        version=version,
+        settings=GlobalSettings.model_validate(settings, from_attributes=True) if settings else None,
+        templates=[Template.model_validate(t, from_attributes=True) for t in db.query(DBTemplate).order_by(DBTemplate.id)],
+        knowledge_base=[
+            KnowledgeBaseEntry.model_validate(e, from_attributes=True)
+            for e in db.query(DBKnowledgeBaseEntry).order_by(DBKnowledgeBaseEntry.id)
+        ],
+        resources=[Resource.model_validate(r, from_attributes=True) for r in db.query(DBResource).order_by(DBResource.id)],
+    )
+
+
+class ReferenceCache:
+    def __init__(self, check_interval: float = REFERENCE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._data: Optional[ReferenceData] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.version_checks = 0
+
+    def get(self) -> ReferenceData:
+        """Текущий снимок. Блокирующий (может сходить в БД): из async-кода — через пул потоков."""
+        data = self._data
+        if data is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return data
+        with self._lock:
+            # Пока ждали замок, снимок мог обновить другой поток
+            if self._data is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._data
+            with database.SessionLocal() as db:
+                if self._data is not None:
+                    self.version_checks += 1
+                    if _read_version(db) == self._data.version:
+                        self._checked_at = time.monotonic()
+                        return self._data
+                self._data = _load(db)
+                self.loads += 1
+                self._checked_at = time.monotonic()
+                return self._data
+
+    def stats(self) -> Dict[str, Any]:
+        data = self._data
+        return {
+            "version": data.version if data else None,
+            "loaded": data is not None,
+            "loads": self.loads,
+            "version_checks": self.version_checks,
+            "check_interval": self.check_interval,
+        }
+
+
+reference_cache = ReferenceCache()
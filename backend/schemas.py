@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 from typing import List, Optional, Dict, Any, Union
 from enum import Enum
 from datetime import datetime
 
+from images import variant_urls, variant_urls_list
+
 class ProjectStatus(str, Enum):
     DRAFT = "DRAFT"
     AI_SCORING = "AI_SCORING"
@@ -71,6 +73,17 @@ class Project(BaseModel):
     projectPhotos: Optional[List[str]] = []
     analysisPhotos: Optional[List[str]] = []
 
+    # Уменьшенные WebP-варианты локальных фото ({"thumb": url, "medium": url}) для списков и карты
+    @computed_field
+    @property
+    def imageVariants(self) -> Optional[Dict[str, str]]:
+        return variant_urls(self.image)
+
+    @computed_field
+    @property
+    def projectPhotoVariants(self) -> List[Optional[Dict[str, str]]]:
+        return variant_urls_list(self.projectPhotos)
+
     class Config:
         from_attributes = True
 
@@ -115,10 +128,17 @@ class Draft(BaseModel):
     location: Optional[str] = None
     coordinates: Optional[Dict[str, Any]] = None
     polygon: Optional[List[List[float]]] = None
+    version: int = 1
 
     class Config:
         from_attributes = True
 
+class DraftAutosaveResult(BaseModel):
+    id: str
+    version: int
+    lastModified: str
+    changed: List[str] = []
+
 class NPOStatus(str, Enum):
     pending = "pending"
     approved = "approved"
@@ -1,11 +1,14 @@
 from database import SessionLocal, engine, init_db
-from models import Base, DBUser, DBProject, DBNPO, DBResource, DBGlobalSettings, DBProjectDetails, DBTemplate, DBKnowledgeBaseEntry
+from models import Base, DBUser, DBProject, DBProjectMember, DBNPO, DBResource, DBGlobalSettings, DBProjectDetails, DBTemplate, DBKnowledgeBaseEntry
 import uuid
 import random
 import os
+import mimetypes
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from main import _build_point_wkt, _build_polygon_wkt
+from storage import LOCAL_PUBLIC_URL, storage
+from reference import mark_changed as mark_reference_changed
 
 # Импортируем манифест загруженных ассетов, если он есть
 try:
@@ -13,9 +16,28 @@ try:
 except ImportError:
     ASSETS = {}
 
+LOCAL_ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "uploads")
+_published_assets = {}
+
+def publish_asset(url):
+    """
+    Ассеты манифеста лежат в репозитории (static/uploads). Если хранилище другое (s3),
+    при первом использовании файл копируется туда, а в БД пишется URL из хранилища.
+    """
+    prefix = LOCAL_PUBLIC_URL + "/"
+    if not url.startswith(prefix):
+        return url
+    key = url[len(prefix):]
+    if key not in _published_assets:
+        if not storage.exists(key):
+            with open(os.path.join(LOCAL_ASSETS_DIR, key), "rb") as f:
+                storage.put_bytes(key, f.read(), mimetypes.guess_type(key)[0] or "application/octet-stream")
+        _published_assets[key] = storage.url(key)
+    return _published_assets[key]
+
 def get_random_asset(category, default):
     if category in ASSETS and ASSETS[category]:
-        return random.choice(ASSETS[category])
+        return publish_asset(random.choice(ASSETS[category]))
     return default
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -173,6 +195,8 @@ def seed_data():
             [lng - 0.001, lat + 0.001]
         ]
 
+        created = datetime.now(timezone.utc) - timedelta(days=random.randint(1, 180))
+
         projects.append(DBProject(
             id=pid,
             title=f"{random.choice(project_titles)} '{pid}'",
@@ -188,8 +212,13 @@ def seed_data():
             type=random.choice(project_types),
             initiatorId=initiator.id,
             npoId=npo.id if npo else None,
-            createdAt=(datetime.now() - timedelta(days=random.randint(1, 180))).strftime("%Y-%m-%d"),
-            participants=[initiator.name] + [u.name for u in random.sample(users[:50], k=random.randint(0, 5))],
+            createdAt=created.strftime("%Y-%m-%d"),
+            created_at=created,
+            updated_at=created,
+            members=[
+                DBProjectMember(user_id=u.id, created_at=created + timedelta(seconds=k))
+                for k, u in enumerate([initiator] + [u for u in random.sample(users[:50], k=random.randint(0, 5)) if u is not initiator])
+            ],
             resources=proj_resources,
             ai_score=random.randint(60, 100),
             search_radius=500
@@ -199,6 +228,7 @@ def seed_data():
 
     # --- 5. Генерация Деталей Проектов ---
     details = []
+    user_names = {u.id: u.name for u in users}
     for p in projects[:50]: # Создадим детали для половины проектов
         details.append(DBProjectDetails(
             id=f"detail-{p.id}",
@@ -206,7 +236,7 @@ def seed_data():
             stage=random.choice(["Планирование", "Закупки", "Строительство", "Приемка"]),
             progress=random.uniform(0, 100) if p.status != "SUCCESS" else 100.0,
             nextMilestone="Завершение этапа через " + str(random.randint(5, 30)) + " дней",
-            collaborators=[{"name": p.participants[0], "role": "Автор", "avatar": ""}],
+            collaborators=[{"name": user_names[p.initiatorId], "role": "Автор", "avatar": ""}],
             documents=[{"name": "ТЗ.pdf", "type": "PDF", "date": p.createdAt, "url": "#"}],
             budget={"spent": p.budget * 0.4, "remaining": p.budget * 0.6, "total": p.budget}
         ))
@@ -244,9 +274,6 @@ def seed_data():
                 geom_polygon=_build_polygon_wkt(poly),
                 status="DRAFT",
                 createdAt=ts.strftime("%Y-%m-%d"),
-                participants=[],
-                pendingJoinRequests=[],
-                ngoPartnerRequests=[],
                 resources=[],
                 type=random.choice(project_types),
                 draft_step=random.randint(1, 4),
@@ -277,6 +304,7 @@ def seed_data():
 
     # Глобальные настройки
     db.add(DBGlobalSettings(id=1, inflationRate=8.5, maxBudget=10000000.0, minBudget=10000.0, defaultSubsidyRate=95.0, currentYear=2024))
+    mark_reference_changed(db)
 
     db.commit()
     db.close()
@@ -0,0 +1,204 @@
+"""
+Хранилище загруженных файлов.
+
+STORAGE_BACKEND выбирает драйвер:
+  local — каталог static/uploads, раздаётся смонтированным StaticFiles (по умолчанию);
+  s3    — S3-совместимое хранилище (AWS S3, MinIO и т. п., нужен пакет boto3): файлы
+          отдаются напрямую из бакета/CDN (S3_PUBLIC_URL), а клиент может загрузить
+          фото сам по presigned URL, минуя воркер API.
+
+Ключ объекта — имя файла (<sha256>.<ext>) или путь варианта (variants/thumb/<stem>.webp).
+В БД хранится публичный URL, который возвращает url(key). Методы блокирующие:
+из async-кода их вызывают через пул потоков.
+"""
+import base64
+import os
+import uuid
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:
+    boto3 = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Модуль импортируется раньше database.py (через schemas -> images), поэтому .env читаем сами
+load_dotenv(dotenv_path=os.path.join(BASE_DIR, ".env"), override=True, encoding="utf-8")
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+# Каталог фиксирован: его раздаёт монтирование /static в main.py (там же лежат моковые ассеты)
+LOCAL_UPLOAD_DIR = os.path.join(BASE_DIR, "static", "uploads")
+LOCAL_PUBLIC_URL = "/static/uploads"
+S3_BUCKET = os.getenv("S3_BUCKET", "uploads")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # для MinIO: http://localhost:9000
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", "600"))
+# Ключи содержат хеш содержимого и не перезаписываются другим содержимым
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StorageReadError(Exception):
+    """Объекта нет или его не удалось прочитать — общая ошибка read() для всех драйверов."""
+
+
+class LocalStorage:
+    direct_uploads = False
+
+    def __init__(self, root: str = LOCAL_UPLOAD_DIR, public_url: str = LOCAL_PUBLIC_URL):
+        self.root = root
+        self.public_url = public_url.rstrip("/")
+        # Временные файлы загрузки — в том же каталоге, чтобы переименование было атомарным
+        self.tmp_dir = root
+        os.makedirs(root, exist_ok=True)
+
+    def local_path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Недопустимый ключ: {key}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.local_path(key))
+
+    def put_file(self, src: str, key: str, content_type: str):
+        """Перемещает готовый локальный файл под ключ key."""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src, path)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def read(self, key: str) -> bytes:
+        try:
+            with open(self.local_path(key), "rb") as f:
+                return f.read()
+        except OSError as e:
+            raise StorageReadError(f"{key}: {e}") from e
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def key_from_url(self, url: Optional[str]) -> Optional[str]:
+        prefix = self.public_url + "/"
+        if not url or not url.startswith(prefix):
+            return None
+        return url[len(prefix):]
+
+    def presigned_upload(self, key: str, content_type: str, size: int, sha256_hex: str) -> Optional[Dict]:
+        return None
+
+
+class S3Storage:
+    direct_uploads = True
+
+    def __init__(
+        self,
+        bucket: str = S3_BUCKET,
+        endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+        region: str = S3_REGION,
+        public_url: Optional[str] = S3_PUBLIC_URL,
+    ):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 требует пакет boto3")
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=os.getenv("S3_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
+            # MinIO и большинство совместимых хранилищ ждут path-style адреса
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path" if endpoint_url else "auto"}),
+        )
+        if public_url:
+            self.public_url = public_url.rstrip("/")
+        elif endpoint_url:
+            self.public_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_url = f"https://{bucket}.s3.{region}.amazonaws.com"
+        self.tmp_dir = None  # системный каталог временных файлов
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, src: str, key: str, content_type: str):
+        try:
+            self.client.upload_file(src, self.bucket, key, ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL})
+        finally:
+            os.unlink(src)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type, CacheControl=IMMUTABLE_CACHE_CONTROL)
+
+    def read(self, key: str) -> bytes:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except (ClientError, BotoCoreError) as e:
+            raise StorageReadError(f"{key}: {e}") from e
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def key_from_url(self, url: Optional[str]) -> Optional[str]:
+        prefix = self.public_url + "/"
+        if not url or not url.startswith(prefix):
+            return None
+        return url[len(prefix):]
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    def presigned_upload(self, key: str, content_type: str, size: int, sha256_hex: str) -> Optional[Dict]:
+        """
+        Presigned PUT. Размер, тип и контрольная сумма входят в подпись: хранилище
+        отклонит тело другого размера или с другим SHA-256, поэтому ключ по хешу честный.
+        """
+        checksum = base64.b64encode(bytes.fromhex(sha256_hex)).decode("ascii")
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": checksum,
+                "CacheControl": IMMUTABLE_CACHE_CONTROL,
+            },
+            ExpiresIn=S3_PRESIGN_EXPIRES,
+        )
+        return {
+            "method": "PUT",
+            "url": url,
+            "headers": {
+                "Content-Type": content_type,
+                "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+                "x-amz-checksum-sha256": checksum,
+            },
+        }
+
+
+def create_storage():
+    if STORAGE_BACKEND == "s3":
+        return S3Storage()
+    return LocalStorage()
+
+
+storage = create_storage()
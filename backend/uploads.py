@@ -0,0 +1,118 @@
+"""
+Сохранение загруженных файлов.
+
+Файл читается из UploadFile частями и пишется во временный файл асинхронно (anyio), поэтому
+event loop не блокируется на время записи. По ходу чтения считается SHA-256, и файл
+сохраняется в хранилище (storage.py) под ключом <sha256>.<ext>: повторная загрузка той же
+фотографии не создаёт копию. Тип определяется по сигнатуре первых байт, а не по расширению
+из имени файла.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from typing import Dict, Optional
+
+import anyio
+from fastapi import UploadFile
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Сигнатуры допустимых форматов -> расширение сохранённого файла
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+)
+
+
+# Для presigned-загрузки байты сервер не видит: тип берётся из заявленного, но только из этого списка
+ALLOWED_CONTENT_TYPES: Dict[str, str] = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadTooLargeError(UploadError):
+    pass
+
+
+class UnsupportedMediaTypeError(UploadError):
+    pass
+
+
+def sniff_content_type(head: bytes) -> Optional[tuple]:
+    """(content_type, расширение) по первым байтам файла или None."""
+    for signature, content_type, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    return None
+
+
+async def save_upload(file: UploadFile, storage, max_bytes: int = UPLOAD_MAX_BYTES) -> str:
+    """Сохраняет файл в хранилище и возвращает его ключ (<sha256>.<ext>)."""
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"Файл больше {max_bytes // (1024 * 1024)} МБ")
+    tmp_path = os.path.join(storage.tmp_dir or tempfile.gettempdir(), f".upload-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+    sniffed = None
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if sniffed is None:
+                    sniffed = sniff_content_type(chunk)
+                    if sniffed is None:
+                        raise UnsupportedMediaTypeError("Поддерживаются только изображения JPEG, PNG, GIF и WebP")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Файл больше {max_bytes // (1024 * 1024)} МБ")
+                digest.update(chunk)
+                await out.write(chunk)
+        if sniffed is None:
+            raise UnsupportedMediaTypeError("Пустой файл")
+
+        content_type, extension = sniffed
+        key = f"{digest.hexdigest()}{extension}"
+        if await anyio.to_thread.run_sync(storage.exists, key):
+            await anyio.Path(tmp_path).unlink()
+        else:
+            # Параллельная загрузка того же файла просто перезапишет идентичное содержимое
+            await anyio.to_thread.run_sync(storage.put_file, tmp_path, key, content_type)
+        return key
+    except BaseException:
+        await anyio.Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def presign_upload(storage, content_type: str, size: int, sha256_hex: str, max_bytes: int = UPLOAD_MAX_BYTES) -> Dict:
+    """
+    Готовит прямую загрузку в хранилище. Если объект с таким хешем уже есть,
+    upload в ответе пустой — загружать ничего не нужно.
+    """
+    extension = ALLOWED_CONTENT_TYPES.get(content_type)
+    if extension is None:
+        raise UnsupportedMediaTypeError("Поддерживаются только изображения JPEG, PNG, GIF и WebP")
+    if size <= 0 or size > max_bytes:
+        raise UploadTooLargeError(f"Файл больше {max_bytes // (1024 * 1024)} МБ")
+    sha256_hex = sha256_hex.lower()
+    if not _SHA256_HEX.match(sha256_hex):
+        raise UploadError("sha256 должен быть hex-строкой из 64 символов")
+    key = f"{sha256_hex}{extension}"
+    upload = None if storage.exists(key) else storage.presigned_upload(key, content_type, size, sha256_hex)
+    return {"key": key, "url": storage.url(key), "upload": upload}
@@ -73,7 +73,7 @@ export function ProjectDetailsModal({ project, open, onClose }: ProjectDetailsMo
               <Card className="col-span-2">
                 <CardContent className="p-0">
                   <img
-                    src={getImageUrl(project.image)}
+                    src={getImageUrl(project.imageVariants?.medium ?? project.image)}
                     alt={project.title}
                     className="w-full aspect-video object-cover rounded-t-xl"
                   />
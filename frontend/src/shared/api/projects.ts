@@ -18,6 +18,29 @@ export interface Draft {
   location?: string;
   coordinates?: { lat: number; lng: number };
   polygon?: number[][];
+  /** Версия для оптимистичной блокировки автосохранения */
+  version?: number;
+}
+
+export interface DraftAutosaveResult {
+  id: string;
+  version: number;
+  lastModified: string;
+  changed: string[];
+}
+
+interface PresignResponse {
+  direct: boolean;
+  url?: string;
+  upload?: { method: string; url: string; headers: Record<string, string> } | null;
+}
+
+// undefined — ещё не знаем, поддерживает ли хранилище прямую загрузку
+let directUploads: boolean | undefined;
+
+async function sha256Hex(file: File): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
 }
 
 export const projectsApi = {
@@ -29,7 +52,27 @@ export const projectsApi = {
     body: JSON.stringify(data),
   }),
 
-  uploadFile: (file: File) => {
+  uploadFile: async (file: File) => {
+    // S3-хранилище: файл уходит напрямую в бакет по presigned URL, минуя API
+    if (directUploads !== false && typeof crypto !== 'undefined' && crypto.subtle) {
+      const presign = await fetchApi<PresignResponse>('/upload/presign', {
+        method: 'POST',
+        body: JSON.stringify({ contentType: file.type, size: file.size, sha256: await sha256Hex(file) }),
+      });
+      directUploads = presign.direct;
+      if (presign.direct && presign.url) {
+        if (presign.upload) {
+          const res = await fetch(presign.upload.url, {
+            method: presign.upload.method,
+            headers: presign.upload.headers,
+            body: file,
+          });
+          if (!res.ok) throw new Error(`Upload failed: ${res.status}`);
+        }
+        return { url: presign.url };
+      }
+    }
+
     const formData = new FormData();
     formData.append('file', file);
     return fetchApi<{ url: string }>('/upload', {
@@ -117,6 +160,12 @@ export const projectsApi = {
     body: JSON.stringify(data),
   }),
   
+  /** Пишет только переданные поля; с version — только поверх этой версии (иначе 409) */
+  autosaveDraft: (id: string, data: Partial<Draft>) => fetchApi<DraftAutosaveResult>(`/projects/drafts/${id}/autosave`, {
+    method: 'PATCH',
+    body: JSON.stringify(data),
+  }),
+  
   deleteDraft: (id: string) => fetchApi<void>(`/projects/drafts/${id}`, {
     method: 'DELETE',
   }),
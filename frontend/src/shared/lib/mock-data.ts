@@ -34,6 +34,7 @@ export interface Project {
   description: string
   budget: number
   image: string
+  imageVariants?: { thumb: string; medium: string } | null
   location: string
   coordinates: { lat: number; lng: number }
   status: ProjectStatuses
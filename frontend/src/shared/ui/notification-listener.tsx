@@ -1,6 +1,6 @@
 "use client"
 
-import { useEffect, useState } from "react"
+import { useEffect, useRef, useState } from "react"
 import { toast } from "sonner"
 import { BASE_URL } from "../api/base"
 import { Bell, BellDot, X, ArrowRight } from "lucide-react"
@@ -19,6 +19,11 @@ export function NotificationListener() {
   const [isOpen, setIsOpen] = useState(false)
   const [isClient, setIsClient] = useState(false)
   const queryClient = useQueryClient()
+  // id последнего полученного уведомления: при подключении сервер дошлёт пропущенные.
+  // Хранится в localStorage по пользователю, чтобы новая вкладка или перезагрузка тоже догружали
+  const lastNotificationId = useRef<number | null>(null)
+  // Доставка «хотя бы один раз» и догрузка с запасом могут прислать уведомление повторно
+  const seenNotificationIds = useRef<Set<number>>(new Set())
   
   const user = queryClient.getQueryData(['authUser']) as any
   const userId = user?.id
@@ -42,17 +47,41 @@ export function NotificationListener() {
       // ignore
     }
     
-    const wsUrl = `${wsProtocol}//${host}/api/ws/notifications/${userId}`
+    const token = localStorage.getItem("token")
+    if (!token) return
+    const cursorKey = `notifications:lastId:${userId}`
+    const storedId = Number(localStorage.getItem(cursorKey))
+    lastNotificationId.current = Number.isInteger(storedId) && storedId > 0 ? storedId : null
+    seenNotificationIds.current = new Set()
+    const wsUrl = `${wsProtocol}//${host}/api/ws/notifications/${userId}?token=${encodeURIComponent(token)}`
     let ws: WebSocket | null = null
     let reconnectTimeout: NodeJS.Timeout
 
     const connect = () => {
       try {
-        ws = new WebSocket(wsUrl)
+        const since = lastNotificationId.current
+        ws = new WebSocket(since !== null ? `${wsUrl}&since=${since}` : wsUrl)
         
         ws.onmessage = (event) => {
           try {
             const data = JSON.parse(event.data)
+
+            // Server heartbeat: reply so the connection isn't evicted as idle
+            if (data.type === "ping") {
+              ws?.send("pong")
+              return
+            }
+
+            if (typeof data.id === "number") {
+              const seen = seenNotificationIds.current
+              if (seen.has(data.id)) return
+              seen.add(data.id)
+              if (seen.size > 1000) seen.delete(seen.values().next().value as number)
+              lastNotificationId.current = Math.max(lastNotificationId.current ?? 0, data.id)
+              // Другая вкладка этого пользователя могла сохранить курсор дальше — назад не двигаем
+              const storedLastId = Number(localStorage.getItem(cursorKey)) || 0
+              localStorage.setItem(cursorKey, String(Math.max(storedLastId, lastNotificationId.current)))
+            }
             
             // Create a new notification object
             const newNotif: AppNotification = {
@@ -386,7 +386,7 @@ ${resources.map(r => `- ${r.name || r.resource}: ${r.quantity} ${r.unit} x ${(r.
             >
               <div className="relative aspect-video rounded-3xl overflow-hidden shadow-2xl mb-6">
                 <img 
-                  src={getImageUrl(project.image)} 
+                  src={getImageUrl(project.imageVariants?.medium ?? project.image)} 
                   alt={project.title} 
                   className="w-full h-full object-cover"
                 />
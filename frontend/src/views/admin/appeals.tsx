@@ -131,7 +131,7 @@ export function AppealsPage({ onActionComplete }: AppealsPageProps) {
             <Card key={project.id} className="group hover:shadow-2xl transition-all border-none shadow-lg overflow-hidden bg-white">
               <CardContent className="p-0 flex flex-col md:flex-row h-full">
                 <div className="w-full md:w-64 h-48 md:h-auto relative shrink-0">
-                  <img src={getImageUrl(project.image)} alt="" className="w-full h-full object-cover grayscale group-hover:grayscale-0 transition-all duration-500" />
+                  <img src={getImageUrl(project.imageVariants?.thumb ?? project.image)} alt="" className="w-full h-full object-cover grayscale group-hover:grayscale-0 transition-all duration-500" />
                   <div className="absolute inset-0 bg-slate-900/20 group-hover:bg-transparent transition-all" />
                 </div>
                 
@@ -185,7 +185,7 @@ export function AllProjectsPage({ user, onBack, onLogout }: AllProjectsPageProps
                   )}
                   <div className="aspect-video bg-muted relative overflow-hidden">
                     <img
-                      src={getImageUrl(project.image)}
+                      src={getImageUrl(project.imageVariants?.thumb ?? project.image)}
                       alt={project.title}
                       className="w-full h-full object-cover"
                     />
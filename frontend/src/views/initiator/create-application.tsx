@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect, useCallback } from "react"
+import { useState, useEffect, useCallback, useRef } from "react"
 import { motion, AnimatePresence } from "framer-motion"
 import { Button } from "@/components/ui/button"
 import { ArrowLeft, LogOut, Save } from "lucide-react"
@@ -13,7 +13,8 @@ import { InitiatorStep5 } from "@/src/features/create-application/ui/step-5"
 import { useApplicationStore } from "@/src/shared/lib/application-store"
 import { AiProcessingLoader, type LoaderMode } from "@/src/features/ai-simulation/ui/ai-processing-loader"
 import { useToast } from "@/hooks/use-toast"
-import { projectsApi } from "@/src/shared/api/projects"
+import { ToastAction } from "@/components/ui/toast"
+import { projectsApi, type Draft, type DraftAutosaveResult } from "@/src/shared/api/projects"
 
 type InitiatorStep = 1 | 2 | 3 | 4 | 5 | 'ai_loading'
 
@@ -57,14 +58,21 @@ export function CreateApplicationPage({
   const [isPublishing, setIsPublishing] = useState(false)
   const [createdProjectId, setCreatedProjectId] = useState<string | null>(null)
   const [isSavingDraft, setIsSavingDraft] = useState(false)
-  const { data, updateData, resetData } = useApplicationStore()
+  const { data, updateData, resetData, setFromDraft } = useApplicationStore()
 
   const readStore = () => useApplicationStore.getState().data
 
+  // Последнее сохранённое состояние черновика: автосохранение шлёт только изменившиеся поля
+  const lastSaved = useRef<{ id: string; version: number; fields: Record<string, string> } | null>(null)
+  // Версия черновика с сервера после 409: автосохранение стоит, пока пользователь не выберет,
+  // загрузить её или перезаписать своей (ручное сохранение)
+  const conflict = useRef<Draft | null>(null)
+
   const handleManualSave = async () => {
     setIsSavingDraft(true)
     try {
-      await saveCurrentDraft(typeof currentStep === "number" ? currentStep : targetStep)
+      const saved = await saveCurrentDraft(typeof currentStep === "number" ? currentStep : targetStep, true)
+      if (!saved) return
       toast({
         title: "Сохранено",
         description: "Черновик успешно сохранен",
@@ -87,53 +95,100 @@ export function CreateApplicationPage({
     const timer = setInterval(() => {
       const d = readStore()
       if ((d.title?.trim() ?? "") !== "" || (d.idea?.trim() ?? "") !== "" || (d.polygon?.length ?? 0) >= 3) {
-        saveCurrentDraft(typeof currentStep === "number" ? currentStep : targetStep)
+        void saveDraftQuietly(typeof currentStep === "number" ? currentStep : targetStep)
       }
     }, 60 * 1000) // каждые 15 секунд
 
     return () => clearInterval(timer)
   }, [currentStep, targetStep, isPublishing])
 
-  // Сохранение черновика (читаем актуальный store — в т.ч. после debounce с шага 1)
-  const saveCurrentDraft = async (step: number) => {
-    try {
-      const d = readStore()
-      const geo = {
-        location: d.location.address || undefined,
-        coordinates: { lat: d.location.lat, lng: d.location.lng },
-        polygon: d.polygon.length >= 3 ? d.polygon : undefined,
+  const draftPayload = (d: ReturnType<typeof readStore>, step: number) => ({
+    title: d.title,
+    description: d.idea,
+    step: step,
+    resources: d.resources,
+    type: d.type,
+    budget: d.budget,
+    projectPhotos: d.projectPhotoUrls,
+    analysisPhotos: d.analysisPhotoUrls,
+    location: d.location.address || undefined,
+    coordinates: { lat: d.location.lat, lng: d.location.lng },
+    polygon: d.polygon.length >= 3 ? d.polygon : undefined,
+  })
+
+  const payloadFields = (payload: Record<string, unknown>) =>
+    Object.fromEntries(Object.entries(payload).map(([k, v]) => [k, JSON.stringify(v ?? null)]))
+
+  const isVersionConflict = (err: unknown) => err instanceof Error && err.message === "Draft version conflict"
+
+  /** Заменить мастер версией черновика с сервера, полученной после 409 */
+  const loadServerDraft = () => {
+    const server = conflict.current
+    if (!server) return
+    conflict.current = null
+    setFromDraft(server)
+    const d = readStore()
+    lastSaved.current = { id: server.id, version: server.version ?? 1, fields: payloadFields(draftPayload(d, server.step)) }
+  }
+
+  const reportConflict = async (id: string) => {
+    conflict.current = await projectsApi.getDraftById(id)
+    toast({
+      variant: "destructive",
+      title: "Черновик изменён в другом окне",
+      description: "Автосохранение приостановлено. Загрузите сохранённую версию или нажмите «Сохранить», чтобы записать свою.",
+      action: (
+        <ToastAction altText="Загрузить сохранённую версию" onClick={loadServerDraft}>
+          Загрузить
+        </ToastAction>
+      ),
+    })
+  }
+
+  // Сохранение черновика (читаем актуальный store — в т.ч. после debounce с шага 1).
+  // false — черновик не записан из-за конфликта версий; прочие ошибки пробрасываются.
+  const saveCurrentDraft = async (step: number, overwrite = false): Promise<boolean> => {
+    const d = readStore()
+    if (d.id) {
+      if (conflict.current?.id === d.id && !overwrite) return false
+      const payload = draftPayload(d, step)
+      const fields = payloadFields(payload)
+      let body: Partial<Draft> = payload
+      if (conflict.current?.id === d.id) {
+        // Осознанная перезапись: всё состояние мастера поверх версии, которую видел пользователь
+        body = { ...payload, version: conflict.current.version ?? 1 }
+      } else {
+        const saved = lastSaved.current?.id === d.id ? lastSaved.current : null
+        if (saved) {
+          const delta = Object.fromEntries(Object.entries(payload).filter(([k]) => saved.fields[k] !== fields[k]))
+          if (Object.keys(delta).length === 0) return true
+          body = { ...delta, version: saved.version }
+        }
       }
-      if (d.id) {
-        await projectsApi.updateDraft(d.id, {
-          title: d.title,
-          description: d.idea,
-          step: step,
-          resources: d.resources,
-          type: d.type,
-          budget: d.budget,
-          projectPhotos: d.projectPhotoUrls,
-          analysisPhotos: d.analysisPhotoUrls,
-          ...geo,
-        })
-      } else if (d.title || d.idea) {
-        const newDraft = await projectsApi.saveDraft({
-          title: d.title,
-          description: d.idea,
-          step: step,
-          resources: d.resources,
-          type: d.type,
-          budget: d.budget,
-          projectPhotos: d.projectPhotoUrls,
-          analysisPhotos: d.analysisPhotoUrls,
-          ...geo,
-        })
-        updateData({ id: newDraft.id })
+      let result: DraftAutosaveResult
+      try {
+        result = await projectsApi.autosaveDraft(d.id, body)
+      } catch (err) {
+        if (!isVersionConflict(err)) throw err
+        await reportConflict(d.id)
+        return false
       }
-    } catch (err) {
-      console.error("Ошибка при сохранении черновика:", err)
+      conflict.current = null
+      lastSaved.current = { id: d.id, version: result.version, fields }
+    } else if (d.title || d.idea) {
+      const newDraft = await projectsApi.saveDraft(draftPayload(d, step))
+      updateData({ id: newDraft.id })
     }
+    return true
   }
 
+  /** Фоновое сохранение (таймер, переходы между шагами): ошибка только в консоль */
+  const saveDraftQuietly = (step: number) =>
+    saveCurrentDraft(step).catch((err) => {
+      console.error("Ошибка при сохранении черновика:", err)
+      return false
+    })
+
   /** Выход с шага 1: сохранить прогресс, чтобы можно было продолжить с фазы 1 */
   const persistDraftOnLeaveFromStepOne = async () => {
     if (isResumeFromDraft) return
@@ -147,7 +202,7 @@ export function CreateApplicationPage({
       (d.polygon?.length ?? 0) >= 3 ||
       (d.location?.address?.trim() ?? "") !== ""
     if (!hasContent) return
-    await saveCurrentDraft(1)
+    await saveDraftQuietly(1)
   }
 
   const handleLeaveToHome = async () => {
@@ -157,7 +212,7 @@ export function CreateApplicationPage({
 
   const handleNextWithLoader = (target: InitiatorStep, mode: LoaderMode) => {
     if (typeof target === "number") {
-      void saveCurrentDraft(target)
+      void saveDraftQuietly(target)
     }
     setTargetStep(target)
     setLoaderMode(mode)
@@ -84,7 +84,7 @@ export function CurrentProjectsPage({ user, onBack, onLogout }: CurrentProjectsP
                 >
                   <div className="aspect-video bg-muted relative overflow-hidden">
                     <img
-                      src={getImageUrl(project.image)}
+                      src={getImageUrl(project.imageVariants?.thumb ?? project.image)}
                       alt={project.title}
                       className="w-full h-full object-cover"
                     />
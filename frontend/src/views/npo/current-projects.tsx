@@ -84,7 +84,7 @@ export function CurrentProjectsNPOPage({ user, onBack, onLogout }: CurrentProjec
               >
                 <div className="aspect-video bg-muted relative overflow-hidden">
                   <img
-                    src={getImageUrl(project.image)}
+                    src={getImageUrl(project.imageVariants?.thumb ?? project.image)}
                     alt={project.title}
                     className="w-full h-full object-cover transition-transform duration-700 group-hover:scale-110"
                   />
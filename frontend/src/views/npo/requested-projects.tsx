@@ -141,7 +141,7 @@ export function RequestedProjectsPage({ user, onBack, onLogout }: RequestedProje
                         </div>
                       </div>
                       <div className="w-16 h-16 md:w-24 md:h-24 rounded-xl md:rounded-2xl overflow-hidden shadow-inner shrink-0">
-                        <img src={getImageUrl(project.image)} alt="" className="w-full h-full object-cover grayscale group-hover:grayscale-0 transition-all duration-500" />
+                        <img src={getImageUrl(project.imageVariants?.thumb ?? project.image)} alt="" className="w-full h-full object-cover grayscale group-hover:grayscale-0 transition-all duration-500" />
                       </div>
                     </div>
                   </CardHeader>